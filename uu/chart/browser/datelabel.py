@@ -1,6 +1,5 @@
 import calendar
 from datetime import date
-import itertools
 
 from Acquisition import aq_base
 from persistent.dict import PersistentDict
@@ -64,12 +63,7 @@ class DateLabelView(object):
         Template should use by iterating over dates and calling .isoformat()
         method for a label and key.
         """
-        all_series = self.context.series()
-        # we can de-dupe point dates since hash(datetime.date()) is reliable:
-        q = itertools.chain(
-            *[[p.identity() for p in series.data] for series in all_series]
-            )
-        return sorted(list(set(q)))  # iterate all unique point identity dates
+        return list(self.context.identities())
     
     def date_to_formatted(self, d):
         usage = getattr(aq_base(self.context), 'label_default', 'locale')
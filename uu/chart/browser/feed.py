@@ -0,0 +1,87 @@
+import json
+
+from plone.uuid.interfaces import IUUID
+
+from uu.chart import feed
+from uu.chart.dependencies import render_version, versions
+from uu.chart.interfaces import CHART_TYPES
+
+from report import ReportView
+
+
+RETRY = 10000       # milliseconds before Server-Sent Events reconnect
+
+
+class ReportFeedView(object):
+    """
+    Change feed for a report: announces the report version, and UIDs of
+    charts changed since a version given by the client (as 'since', or
+    the Last-Event-ID header sent by EventSource on reconnect).  It
+    never waits for changes: each request would hold one of the (few)
+    Zope worker threads, so clients wait between requests instead.
+
+    Requests accepting text/event-stream get a single Server-Sent Event
+    ('changed', if charts changed) and a retry interval, after which
+    the client reconnects.  Others (polling clients) get JSON:
+
+      {"version": 12, "changed": ["uid1", "uid2"]}
+    """
+
+    def __init__(self, context, request):
+        self.context = context  # IDataReport
+        self.request = request
+
+    def since(self):
+        value = self.request.getHeader('Last-Event-ID', None)
+        if not value:
+            value = self.request.get('since', None)
+        try:
+            return int(value) if value not in (None, '') else None
+        except ValueError:
+            return None
+
+    def changed_charts(self, since):
+        """UIDs of charts in report with versions after since"""
+        brains = ReportView(self.context, None).element_brains(CHART_TYPES)
+        uids = [brain.UID for brain in brains]
+        chart_versions = versions(*uids) or [0] * len(uids)
+        return [
+            uid for uid, version in zip(uids, chart_versions)
+            if version > since
+            ]
+
+    def changes(self, since):
+        current = render_version(self.context)
+        if current is None or since is None:
+            return {'version': current, 'changed': []}
+        if current > since:
+            return {'version': current, 'changed': self.changed_charts(since)}
+        # committed in this process after this request's view of database:
+        version, uids = feed.changes_since(IUUID(self.context), since)
+        if version is None:
+            return {'version': current, 'changed': []}
+        return {'version': version, 'changed': uids}
+
+    def event_stream(self, result):
+        lines = ['retry: %s' % RETRY]
+        if result['version'] is not None:
+            lines.append('id: %s' % result['version'])
+        if result['changed']:
+            lines.append('event: changed')
+            lines.append('data: %s' % json.dumps(result))
+        else:
+            lines.append(': no changes')
+        return '\n'.join(lines) + '\n\n'
+
+    def __call__(self, *args, **kwargs):
+        response = self.request.response
+        response.setHeader('Cache-Control', 'no-cache')
+        accept = self.request.getHeader('Accept', '') or ''
+        if 'text/event-stream' in accept:
+            msg = self.event_stream(self.changes(self.since()))
+            response.setHeader('Content-type', 'text/event-stream')
+        else:
+            msg = json.dumps(self.changes(self.since()))
+            response.setHeader('Content-type', 'application/json')
+        response.setHeader('Content-length', str(len(msg)))
+        return msg
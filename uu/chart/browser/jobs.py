@@ -0,0 +1,35 @@
+import json
+
+from uu.chart.jobs import get_queue
+
+
+class JobStatusView(object):
+    """
+    JSON status of background jobs queued for context (or items within
+    it).  Returns an array of job status objects (oldest first), or a
+    single job status object if a job id is given in request as 'job'.
+    """
+
+    def __init__(self, context, request):
+        self.context = context
+        self.request = request
+
+    def status(self):
+        queue = get_queue(self.context, create=False)
+        path = self.context.getPhysicalPath()
+        job_id = self.request.get('job', None)
+        if queue is None:
+            return None if job_id is not None else []
+        if job_id is not None:
+            found = queue.get(job_id)
+            if found is None or found.path[:len(path)] != path:
+                return None
+            return found.info()
+        return [job.info() for job in queue.jobs(path)]
+
+    def __call__(self, *args, **kwargs):
+        msg = json.dumps(self.status(), indent=2)
+        self.request.response.setHeader('Content-type', 'application/json')
+        self.request.response.setHeader('Cache-Control', 'no-cache')
+        self.request.response.setHeader('Content-length', str(len(msg)))
+        return msg
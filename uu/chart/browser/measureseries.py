@@ -1,13 +1,22 @@
 import json
 
-from plone.uuid.interfaces import IUUID
+from Acquisition import aq_inner, aq_parent
+from zope.annotation.interfaces import IAnnotations
 from zope.component.hooks import getSite
+from zope.lifecycleevent.interfaces import IObjectMovedEvent
 from Products.CMFCore.utils import getToolByName
 
-from uu.formlibrary.measure.interfaces import IMeasureDefinition
+from uu.chart.cache import BoundedCache
+from uu.chart.interfaces import DATASET_TYPE, MEASURE_DEFINITION_TYPE
+from uu.chart.interfaces import MEASURE_GROUP_TYPE
 
 
-DATASET_TYPE = 'uu.formlibrary.setspecifier'
+# version of dataset listing, kept in annotation of group (folder):
+LISTING_VERSION_KEY = 'uu.chart.datasets_version'
+
+# dataset lists by group path: (listing version, list of (UID, Title))
+CACHE_LIMIT = 1000  # groups kept in cache
+_cache = BoundedCache(CACHE_LIMIT)
 
 
 class DatasetListerView(object):
@@ -28,11 +37,25 @@ class DatasetListerView(object):
         self.request = request
         self.portal = getSite()
     
-    def _datasets(self, group):
-        return filter(
-            lambda o: o.portal_type == DATASET_TYPE,
-            group.objectValues(),
-            )
+    def _datasets(self, group_path):
+        """
+        List of (UID, Title) for datasets in group, from catalog brains;
+        cached by group path, until the listing version of group changes.
+        """
+        catalog = getToolByName(self.portal, 'portal_catalog')
+        group = self.portal.unrestrictedTraverse(group_path, None)
+        version = listing_version(group) if group is not None else None
+        cached = _cache.get(group_path)
+        if cached is not None and version is not None and cached[0] == version:
+            return cached[1]
+        brains = catalog.unrestrictedSearchResults({
+            'path': {'query': group_path, 'depth': 1},
+            'portal_type': DATASET_TYPE,
+            'sort_on': 'getObjPositionInParent',
+            })
+        result = [(b.UID, b.Title) for b in brains]
+        _cache[group_path] = (version, result)
+        return result
     
     def ispath(self, id):
         return (
@@ -49,17 +72,85 @@ class DatasetListerView(object):
         if self.ispath(measure_uid):
             r = find({'path': {'query': measure_uid, 'depth': 0}})
             measure_uid = r[0].UID if r else None  # value from catalog brain
-        r = find({'UID': measure_uid})
-        if not measure_uid or not r:
+        r = find({'UID': measure_uid}) if measure_uid else None
+        if not r or r[0].portal_type != MEASURE_DEFINITION_TYPE:
             req.response.setHeader('Content-Length', 2)
             return '[]'   # empty
-        measure = r[0]._unrestrictedGetObject()
-        if not IMeasureDefinition.providedBy(measure):
-            req.response.setHeader('Content-Length', 2)
-            return '[]'   # empty
-        group = measure.__parent__
-        _info = lambda o: (IUUID(o), o.Title())
-        msg = json.dumps(map(_info, self._datasets(group)))
+        group_path = r[0].getPath().rsplit('/', 1)[0]
+        msg = json.dumps(self._datasets(group_path))
         req.response.setHeader('Content-Length', len(msg))
         return msg
 
+
+
+def listing_version(group):
+    """Version of dataset listing for group, changed by its datasets"""
+    annotations = IAnnotations(group, None)
+    if annotations is None:
+        return None
+    return annotations.get(LISTING_VERSION_KEY, 0)
+
+
+def _bump_listing_version(group):
+    annotations = IAnnotations(group, None)
+    if annotations is not None:
+        annotations[LISTING_VERSION_KEY] = (
+            annotations.get(LISTING_VERSION_KEY, 0) + 1
+            )
+
+
+def _title_changed(event):
+    """
+    Might modification event change title?  True unless the event
+    describes the changed attributes, and title is not among them.
+    """
+    descriptions = getattr(event, 'descriptions', None)
+    if not descriptions:
+        return True
+    for description in descriptions:
+        names = getattr(description, 'attributes', None)
+        if names is None:
+            return True
+        if [n for n in names if n.split('.')[-1] == 'title']:
+            return True  # title, or behavior-prefixed (IBasic.title)
+    return False
+
+
+def handle_dataset_changed(context, event):
+    """
+    Dataset added, removed, moved or modified (in title): change listing
+    version of group(s) containing it; renaming a dataset, or modifying
+    anything but its title, leaves listings unchanged.
+    """
+    if getattr(context, 'portal_type', None) != DATASET_TYPE:
+        return
+    if IObjectMovedEvent.providedBy(event):
+        if event.oldParent is event.newParent:
+            return  # renamed: same UID, title, position
+        groups = (event.oldParent, event.newParent)
+    elif _title_changed(event):
+        groups = (aq_parent(aq_inner(context)),)
+    else:
+        return
+    for group in groups:
+        if group is not None:
+            _bump_listing_version(group)
+
+
+def handle_group_modified(context, event):
+    """
+    Measure group modified (e.g. reordered): change listing version, if
+    it contains datasets.
+    """
+    if getattr(context, 'portal_type', None) != MEASURE_GROUP_TYPE:
+        return
+    catalog = getToolByName(context, 'portal_catalog', None)
+    if catalog is None:
+        return
+    found = catalog.unrestrictedSearchResults({
+        'path': {'query': '/'.join(context.getPhysicalPath()), 'depth': 1},
+        'portal_type': DATASET_TYPE,
+        'sort_limit': 1,
+        })
+    if len(found):
+        _bump_listing_version(context)
@@ -5,11 +5,13 @@ from persistent.dict import PersistentDict
 from Acquisition import aq_base
 from plone.dexterity.utils import createContentInContainer
 from plone.app.uuid.utils import uuidToObject
+from Products.CMFPlone.utils import safe_unicode
 from Products.statusmessages.interfaces import IStatusMessage
 
 from uu.chart.interfaces import TIMESERIES_TYPE, NAMEDSERIES_TYPE
 from uu.chart.interfaces import DATE_AXIS_LABEL_CHOICES
 from uu.chart.interfaces import MEASURESERIES_DATA
+from uu.chart.jobs import enqueue
 
 try:
     from collective.teamwork.utils import get_workspaces
@@ -22,11 +24,115 @@ except ImportError:
         HAS_WORKSPACES = False
 
 
+# population creating more content items than this runs as background job:
+BACKGROUND_THRESHOLD = 40
+
+POPULATE_JOB = 'uu.chart.browser.populate.populate_job'
+
+
 class Naming(object):
     def __init__(self, title):
         self.title = title
 
 
+def apply_date_settings(chart, settings):
+    """Apply date settings (dict) from population form to chart"""
+    start_date = settings.get('start')
+    end_date = settings.get('end')
+    chart.force_crop = settings.get('force_crop', False)
+    if settings.get('use_baseline', False):
+        label = 'Baseline'
+        chart.label_overrides = PersistentDict([(start_date, label)])
+    if start_date:
+        chart.start = start_date
+    if end_date:
+        chart.end = end_date
+
+
+def create_series(chart, measure_uid, ds_info, display_precision=1):
+    _ignore = ('portal_type', 'uid')
+    kw = dict((k, v) for k, v in ds_info.items() if k not in _ignore)
+    mseries = createContentInContainer(
+        chart,
+        MEASURESERIES_DATA,
+        **kw
+        )
+    mseries.measure = measure_uid
+    mseries.dataset = ds_info.get('uid')
+    mseries.display_precision = display_precision
+    mseries.reindexObject()
+    return mseries
+
+
+def populate_charts(report, charts, series, settings, start=0):
+    """
+    Given lists of info dicts for charts, series for each, create content
+    in report; yields (done, total) progress after each chart created,
+    from chart at index start (charts before it already created).
+    """
+    _ignore = ('portal_type', 'uid')
+    total = len(charts)
+    for idx, m_info in enumerate(charts):
+        if idx < start:
+            continue
+        kw = dict((k, v) for k, v in m_info.items() if k not in _ignore)
+        chart = createContentInContainer(
+            report,
+            m_info.get('portal_type', TIMESERIES_TYPE),
+            **kw
+            )
+        apply_date_settings(chart, settings)
+        for ds_info in series:
+            create_series(
+                chart,
+                m_info.get('uid'),
+                ds_info,
+                m_info.get('display_precision', 1),
+                )
+        yield idx + 1, total
+
+
+def _created_chart(report, chart_info):
+    """Last chart in report of type and title of chart_info, or None"""
+    found = [
+        o for o in report.objectValues()
+        if o.portal_type == chart_info.get('portal_type') and
+        o.title == chart_info.get('title')
+        ]
+    return found[-1] if found else None
+
+
+def populate_multimeasure(report, chart_info, series, settings, start=0):
+    """
+    Given info dict for one chart, and a list of info dicts for its
+    series (each with a measure and dataset uid), create content in report;
+    yields (done, total) progress after each series is created, from
+    series at index start (chart, and series before it already created).
+    """
+    chart = _created_chart(report, chart_info) if start else None
+    if chart is None:
+        chart = createContentInContainer(report, **chart_info)
+        apply_date_settings(chart, settings)
+    total = len(series)
+    for idx, s_info in enumerate(series):
+        if idx < start:
+            continue
+        create_series(
+            chart,
+            s_info.get('measure'),
+            {'uid': s_info.get('dataset'), 'title': s_info.get('title')},
+            chart_info.get('display_precision', 1),
+            )
+        yield idx + 1, total
+
+
+def populate_job(report, mode, start=0, **kwargs):
+    """Job function for background population of report components"""
+    if mode == 'multi-measure':
+        return populate_multimeasure(report, start=start, **kwargs)
+    return populate_charts(report, start=start, **kwargs)
+
+
 class ReportPopulateView(object):
 
     DATE_LABEL_CHOICES = DATE_AXIS_LABEL_CHOICES
@@ -51,18 +157,42 @@ class ReportPopulateView(object):
         month, day, year = [int(v) for v in stamp.strip().split('/')]
         return datetime.date(year, month, day)
 
-    def _set_date_settings(self, chart):
-        start_date = self._date(self.request.get('start-date', None))
-        end_date = self._date(self.request.get('end-date', None))
-        use_baseline = self.request.get('use-baseline', False)
-        chart.force_crop = self.request.get('force-crop', False)
-        if use_baseline:
-            label = 'Baseline'
-            chart.label_overrides = PersistentDict([(start_date, label)])
-        if start_date:
-            chart.start = start_date
-        if end_date:
-            chart.end = end_date
+    def date_settings(self):
+        """Date settings from request, as dict of picklable values"""
+        return {
+            'start': self._date(self.request.get('start-date', None)),
+            'end': self._date(self.request.get('end-date', None)),
+            'use_baseline': bool(self.request.get('use-baseline', False)),
+            'force_crop': bool(self.request.get('force-crop', False)),
+            }
+
+    def run(self, mode, count, **kwargs):
+        """
+        Run population (or queue as background job if count of items to
+        create is large); returns True if run, False if queued.
+        """
+        if count <= BACKGROUND_THRESHOLD:
+            for progress in populate_job(self.context, mode, **kwargs):
+                pass
+            return True
+        job = enqueue(
+            self.context,
+            POPULATE_JOB,
+            title=u'Populate report: %s' % safe_unicode(self.context.Title()),
+            mode=mode,
+            **kwargs
+            )
+        self.status.addStatusMessage(
+            u'Creating %s report components in the background; charts '
+            u'will appear in this report as they are created.  Job '
+            u'status: %s/@@chart_jobs?job=%s' % (
+                count,
+                self.context.absolute_url(),
+                job.id,
+                ),
+            type='info',
+            )
+        return False
 
     def _measureinfo(self, uid):
         raw = self.request.form
@@ -140,28 +270,16 @@ class ReportPopulateView(object):
 
     def populate(self, charts, series):
         """Given lists of charts, series for each, create content"""
-        _ignore = ('portal_type', 'uid')
-        for m_info in charts:
-            kw = dict((k, v) for k, v in m_info.items() if k not in _ignore)
-            chart = createContentInContainer(
-                self.context,
-                m_info.get('portal_type', TIMESERIES_TYPE),
-                **kw
-                )
-            self._set_date_settings(chart)
-            for ds_info in series:
-                kw = dict(
-                    (k, v) for k, v in ds_info.items() if k not in _ignore
-                    )
-                mseries = createContentInContainer(
-                    chart,
-                    MEASURESERIES_DATA,
-                    **kw
-                    )
-                mseries.measure = m_info.get('uid')
-                mseries.dataset = ds_info.get('uid')
-                mseries.display_precision = m_info.get('display_precision', 1)
-                mseries.reindexObject()
+        count = len(charts) * (len(series) + 1)
+        done = self.run(
+            'per-measure',
+            count,
+            charts=charts,
+            series=series,
+            settings=self.date_settings(),
+            )
+        if not done:
+            return
         self.status.addStatusMessage(
             'Created %s charts (per-measure), containing %s series each.' % (
                 len(charts),
@@ -186,11 +304,7 @@ class ReportPopulateView(object):
             self.status.addStatusMessage(msg, type='error')
             return
         kw = self._multi_measure_chart_info()
-        chart = createContentInContainer(
-            self.context,
-            **kw
-            )
-        self._set_date_settings(chart)
+        series = []
         for measure_uid, ds_uid in itertools.product(measures, datasets):
             m_title = _value('title-%s' % measure_uid)
             ds_title = _value('title-%s' % ds_uid)
@@ -200,18 +314,20 @@ class ReportPopulateView(object):
                 self.status.addStatusMessage(msg, type='error')
                 return
             legend_label = '%s -- %s' % (ds_title, m_title)
-            series_info = {
+            series.append({
                 'title': legend_label,
-                'portal_type': MEASURESERIES_DATA,
-                }
-            mseries = createContentInContainer(
-                chart,
-                **series_info
-                )
-            mseries.measure = measure_uid
-            mseries.dataset = ds_uid
-            mseries.display_precision = kw.get('display_precision', 1)
-            mseries.reindexObject()
+                'measure': measure_uid,
+                'dataset': ds_uid,
+                })
+        done = self.run(
+            'multi-measure',
+            len(series) + 1,
+            chart_info=kw,
+            series=series,
+            settings=self.date_settings(),
+            )
+        if not done:
+            return
         self.status.addStatusMessage(
             'Created a multi-measure chart with %s series and %s '
             'data-sets' % (len(measures), len(datasets)),
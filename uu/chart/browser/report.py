@@ -1,15 +1,16 @@
 from AccessControl.SecurityManagement import getSecurityManager
+from AccessControl.SpecialUsers import system
+from Acquisition import aq_base
+from Products.CMFCore.utils import getToolByName
 
 from uu.chart.browser.chart import ChartView
 
 
 def batch(items, b_start=0, b_size=None):
     """
-    Simple batching that does not try to avoid loading objects from
-    ZODB; rather, the win (for report loading via ReportJSON view),
-    is from avoiding the overhead of getting data.  There is benefit
-    in pre-loading the content for the report; batching should not
-    try to avoid that.
+    Simple batching of a sequence; for catalog results (lazy sequence
+    of brains) slicing does not wake any content objects, so only those
+    objects in the batch need be loaded from ZODB.
     """
     if b_size is None and not b_start:
         return items  # no batching specified
@@ -28,19 +29,43 @@ class ReportView(ChartView):
         'Document',
         )
 
-    def chart_elements(self, types=None, b_start=0, b_size=None):
-        sm = getSecurityManager()
-        content = filter(
-            lambda o: sm.checkPermission('View', o),
-            filter(
-                lambda o: o.portal_type in self.ELEMENT_TYPES,
-                self.context.contentValues(),
+    def element_brains(self, types=None, uids=None):
+        """
+        Catalog brains for elements contained in report, visible to the
+        current user (including expired or not yet effective elements,
+        as contained in report), in order of position in report;
+        optionally only of types given (none if none of them are element
+        types), and only for a sequence of element UIDs.
+        """
+        catalog = getToolByName(self.context, 'portal_catalog')
+        if aq_base(getSecurityManager().getUser()) is system:
+            # catalog role filtering does not know system user can View:
+            search = catalog.unrestrictedSearchResults
+        else:
+            search = lambda query: catalog.searchResults(
+                query,
+                show_inactive=True,
                 )
-            )
         if types:
-            content = filter(
-                lambda o: o.portal_type in types,
-                content,
-                )
-        return batch(content, b_start, b_size)
- 
+            types = [t for t in self.ELEMENT_TYPES if t in types]
+            if not types:
+                return []
+        query = {
+            'path': {
+                'query': '/'.join(self.context.getPhysicalPath()),
+                'depth': 1,
+                },
+            'portal_type': types or self.ELEMENT_TYPES,
+            'sort_on': 'getObjPositionInParent',
+            }
+        if uids is not None:
+            query['UID'] = list(uids)
+        return search(query)
+
+    snapshot = None  # ReportSnapshot to render elements from, if any
+
+    def chart_elements(self, types=None, b_start=0, b_size=None):
+        if self.snapshot is not None and not (types or b_start or b_size):
+            return list(self.snapshot.elements)
+        brains = batch(self.element_brains(types), b_start, b_size)
+        return [brain.getObject() for brain in brains]
@@ -220,11 +220,21 @@ function autofitTextSize(cell, width) {
     ns.mergedColumnHeadings = function (plot) {
         var series = plot.series,
             headings = [],
+            seen = {},
             ncmp = function (a, b) { return a - b; };
+        if (uu.chart.identities) {
+            // server-computed identities of chart, if available:
+            headings = uu.chart.identities(uu.chart.plotid(plot.target));
+            if (headings) {
+                return headings;
+            }
+            headings = [];
+        }
         series.forEach(function (s) {
             s.data.forEach(function (pair) {
                 var key = pair[0];
-                if ($.inArray(key, headings) === -1) {
+                if (!seen.hasOwnProperty(key)) {
+                    seen[key] = true;
                     headings.push(key);
                 }
             });
@@ -194,13 +194,50 @@ uu.chart = (function (ns, $) {
         return Object.keys(rset);
     };
 
+    /**
+     * identities(): x-axis values for all point identities in chart for
+     * uid, in order, from chart's server-computed identities: dates as
+     * milliseconds since epoch, named categories as 1..N.  Returns null
+     * if chart data does not include identities.
+     */
+    ns.identities = function (uid) {
+        var data = ns.saved_data[uid];
+        if (!data) {
+            return null;
+        }
+        if (data.x_axis_type === 'date' && data.labels) {
+            return Object.keys(data.labels).map(function (k) {
+                return utils.date(k).getTime();
+            }).sort(function (a, b) { return a - b; });
+        }
+        if (data.categories) {
+            return data.categories.map(function (k, idx) {
+                return idx + 1;
+            });
+        }
+        return null;
+    };
+
     ns.seriesdata = function (data) {
-        var r = [];
+        var r = [],
+            positions = {};
+        (data.categories || []).forEach(function (k, idx) {
+            positions[k] = idx;
+        });
         (data.series || []).forEach(function (s) {
             var s_rep = [];
             if (!(s.data && s.data.length)) {
                 return;  // no/empty data, ignore series
             }
+            if (data.x_axis_type !== 'date' && data.categories) {
+                // named: one value per category, null for missing points
+                s_rep = data.categories.map(function () { return null; });
+                s.data.forEach(function (pair) {
+                    s_rep[positions[pair[0]]] = pair[1].value;
+                });
+                r.push(s_rep);
+                return;
+            }
             (s.data || []).forEach(function (pair) {
                 var key = pair[0],
                     point = pair[1],
@@ -258,6 +295,31 @@ uu.chart = (function (ns, $) {
         return (defer) ? chartDefault : optIn;
     };
 
+    /* plot coordinates of start/end of server-computed series trend */
+    ns.trenddata = function (data, trend) {
+        var x = function (key) {
+            if (data.x_axis_type === 'date') {
+                return utils.date(key).getTime();
+            }
+            return (data.categories || []).indexOf(key) + 1;
+        };
+        return [
+            [x(trend.start[0]), trend.start[1]],
+            [x(trend.end[0]), trend.end[1]]
+        ];
+    };
+
+    /* y-values of horizontal lines: goal (if any), SPC center, limits */
+    ns.spclines = function (data, spc) {
+        var r = (data.goal) ? [data.goal] : [];
+        r.push(spc.center);
+        if (hasValue(spc.ucl)) {
+            r.push(spc.ucl);
+            r.push(spc.lcl);
+        }
+        return r;
+    };
+
     ns.seriesoptions = function (data) {
         var r = [];
         (data.series || []).forEach(function (s) {
@@ -293,6 +355,18 @@ uu.chart = (function (ns, $) {
             if (s.show_trend === true) {
                 options.trendline.label = 'Trend' + ((s.title) ? ': ' + s.title : '');
             }
+            if (s.spc) {
+                // SPC center line (and control limits), drawn with any goal
+                options.thresholdLines = {
+                    lineColor: s.color || undefined,
+                    labelColor: s.color || undefined,
+                    yValues: ns.spclines(data, s.spc)
+                };
+            }
+            if (s.show_trend === true && s.trend) {
+                // fit computed by server: plugin draws line through endpoints
+                options.trendline.data = ns.trenddata(data, s.trend);
+            }
             r.push(options);
         });
         return r;
@@ -717,7 +791,7 @@ uu.chart = (function (ns, $) {
             };
         } else { /* named */
             x_axis.renderer = $.jqplot.CategoryAxisRenderer;
-            x_axis.ticks = ns.uniquekeys(data);
+            x_axis.ticks = data.categories || ns.uniquekeys(data);
         }
         if (legend_placement) {
             if (data.series.length > 1 || legend_placement === 'tabular') {
@@ -823,47 +897,330 @@ uu.chart = (function (ns, $) {
         });
     };
 
-    ns.geometric_batch = function (length) {
-        var r = [],
-            size = 1,
-            pos = 0;
-        while (size <= length) {
-            r.push([pos, Math.min(size, length-pos)]);
-            pos = pos + size;
-            size += size;  // 1, 2, 4, 8, 16, 32,...N
+    ns.LAZY_THRESHOLD = 8;  // reports with more charts load lazily
+    ns.LAZY_MARGIN = 1.0;   // load charts within this many viewports
+
+    ns.cachebust = function () {
+        var rnd = (Math.floor(Math.random() * Math.pow(10,8)));
+        return '&cache_bust=' + rnd;
+    };
+
+    ns.drawbatch = function (response) {
+        response.forEach(function (info) {
+            var uid = info[0],      // uid key
+                data = info[1];     // chart data value
+            ns.drawchart(uid, data);
+        });
+    };
+
+    /**
+     * seenversion(): keep lowest report version (X-Report-Version header)
+     * of any response loading report charts, as token for watchreport,
+     * and for refreshreport of charts with no version of their own.
+     */
+    ns.report_version = null;
+    ns.seenversion = function (xhr) {
+        var version = parseInt(xhr.getResponseHeader('X-Report-Version'), 10);
+        if (isNaN(version)) {
+            return;
         }
-        return r;
+        if (ns.report_version === null || version < ns.report_version) {
+            ns.report_version = version;
+        }
+    };
+
+    /* merge delta of series into saved series, by point key */
+    ns.mergeseries = function (saved, delta, data) {
+        var points = {},
+            keys = [],
+            order = {};
+        if (!saved || !delta.partial) {
+            return delta;
+        }
+        saved.data.forEach(function (pair) {
+            points[pair[0]] = pair;
+            keys.push(pair[0]);
+        });
+        delta.data.forEach(function (pair) {
+            if (!points.hasOwnProperty(pair[0])) {
+                keys.push(pair[0]);
+            }
+            points[pair[0]] = pair;
+        });
+        (delta.removed || []).forEach(function (key) {
+            delete points[key];
+        });
+        (data.categories || []).forEach(function (k, idx) {
+            order[k] = idx;
+        });
+        keys = keys.filter(function (key) {
+            return points.hasOwnProperty(key);
+        });
+        keys.sort(function (a, b) {
+            if (data.x_axis_type === 'date') {
+                return (a < b) ? -1 : ((a > b) ? 1 : 0);  // ISO 8601 dates
+            }
+            return order[a] - order[b];
+        });
+        return $.extend({}, delta, {
+            data: keys.map(function (key) { return points[key]; }),
+            partial: undefined,
+            removed: undefined
+        });
+    };
+
+    /* merge chart delta into saved data for chart */
+    ns.mergechart = function (uid, delta) {
+        var saved = ns.saved_data[uid],
+            series = {};
+        if (!saved || !delta.delta) {
+            return delta;  // complete chart data
+        }
+        (saved.series || []).forEach(function (s) {
+            series[s.uid] = s;
+        });
+        delta.series.forEach(function (s) {
+            series[s.uid] = ns.mergeseries(series[s.uid], s, delta);
+        });
+        return $.extend({}, delta, {
+            series: delta.series_order.map(function (suid) {
+                return series[suid];
+            }).filter(function (s) { return !!s; }),
+            delta: undefined,
+            series_order: undefined
+        });
     };
 
+    /**
+     * loadedcharts(): loaded charts, as uid:version of data held for
+     * each, comma-separated (version empty if chart has none).
+     */
+    ns.loadedcharts = function () {
+        return Object.keys(ns.saved_data).map(function (uid) {
+            var version = ns.saved_data[uid].version;
+            return uid + ':' + (version === undefined ? '' : version);
+        }).join(',');
+    };
 
+    /**
+     * refreshreport(): fetch only loaded charts changed since the version
+     * held of each, merge into saved data, redraw changed charts; charts
+     * no longer in report are cleared.  Charts not (yet) loaded are left
+     * to lazy loading.
+     */
+    ns.refreshreport = function (url) {
+        var loaded = ns.loadedcharts();
+        if (ns.report_version === null || !loaded) {
+            return;
+        }
+        $.ajax({
+            url: url + '?since=' + ns.report_version +
+                '&loaded=' + loaded + ns.cachebust(),
+            dataType: 'json',
+            success: function (response) {
+                var current = {};
+                response.uids.forEach(function (uid) {
+                    current[uid] = true;
+                });
+                response.charts.forEach(function (info) {
+                    if (!ns.saved_data[info[0]]) {
+                        return;  // not loaded: never draw from a delta
+                    }
+                    ns.drawchart(info[0], ns.mergechart(info[0], info[1]));
+                });
+                Object.keys(ns.saved_data).forEach(function (uid) {
+                    if (!current[uid]) {
+                        delete ns.saved_data[uid];
+                        ns.cleardiv(ns.divfor(uid));
+                    }
+                });
+                if (response.version !== null) {
+                    ns.report_version = response.version;
+                }
+            }
+        });
+    };
+
+    /**
+     * loadreport(): load charts in report in batches of geometrically
+     * increasing size (1, 2, 4, 8, ...), each request passing the
+     * server-issued cursor of the previous batch; each batch only
+     * costs the server work for the charts it contains.  A static
+     * report.json (array of all charts) is drawn as-is.
+     */
     ns.loadreport = function (url) {
-        var total = $('.chartdiv').length,
-            rnd = (Math.floor(Math.random() * Math.pow(10,8))),
-            cacheBust = '&cache_bust=' + rnd,
-            batch_spec = ns.geometric_batch(total);
-        batch_spec.forEach(function (pair) {
-            var pos = pair[0],
-                size = pair[1],
-                qs = 'b_size=' + size + '&b_start=' + pos + cacheBust,
-                batchurl = url + '?' + qs;
+        var cacheBust = ns.cachebust(),
+            loadbatch;
+        loadbatch = function (cursor, size) {
+            var qs = 'b_size=' + size + '&cursor=' + cursor + cacheBust;
             $.ajax({
-                url: batchurl,
+                url: url + '?' + qs,
                 dataType: 'json',
-                success: function (response) {
-                    response.forEach(function (info) {
-                        var uid = info[0],      // uid key
-                            data = info[1];     // chart data value
-                        ns.drawchart(uid, data);
-                    });
+                success: function (response, status, xhr) {
+                    if ($.isArray(response)) {
+                        ns.drawbatch(response);  // static, all charts
+                        return;
+                    }
+                    ns.seenversion(xhr);
+                    ns.drawbatch(response.charts);
+                    if (response.cursor) {
+                        loadbatch(encodeURIComponent(response.cursor), size * 2);
+                    }
                 }
             });
+        };
+        loadbatch('', 1);
+    };
+
+    /**
+     * fetchcharts(): priority fetch of report charts by UID, in a single
+     * request; charts are drawn in order of UIDs given.
+     */
+    ns.fetchcharts = function (url, uids) {
+        if (!uids.length) {
+            return;
+        }
+        $.ajax({
+            url: url + '?uids=' + uids.join(',') + ns.cachebust(),
+            dataType: 'json',
+            success: function (response, status, xhr) {
+                ns.seenversion(xhr);
+                ns.drawbatch(response);
+            }
+        });
+    };
+
+    /**
+     * chartwindow(): re-draw a time-series chart for a window of dates
+     * (Date objects or YYYY-MM-DD strings; either may be null), fetching
+     * only points in that window from chart JSON, e.g. to zoom or pan.
+     */
+    ns.chartwindow = function (uid, start, end) {
+        var div = ns.divfor(uid),
+            pad = function (n) { return (n < 10) ? '0' + n : String(n); },
+            fmt = function (d) {
+                if (!d || typeof d === 'string') {
+                    return d || '';
+                }
+                return [
+                    d.getFullYear(),
+                    pad(d.getMonth() + 1),
+                    pad(d.getDate())
+                ].join('-');
+            },
+            url;
+        if (!div.length) {
+            return;
+        }
+        url = $('a[type="application/json"]', div).attr('href').split('?')[0];
+        $.ajax({
+            url: url + '?start=' + fmt(start) + '&end=' + fmt(end) + ns.cachebust(),
+            dataType: 'json',
+            success: function (response) {
+                ns.drawchart(uid, response);
+            }
         });
     };
 
+    /**
+     * lazyreport(): load charts only as they near the viewport (within
+     * LAZY_MARGIN viewport heights), on scroll and resize.  Charts in
+     * viewport are fetched first, then those in the margin.
+     */
+    ns.lazyreport = function (url) {
+        var win = $(window),
+            pending = $('.chartdiv').toArray(),
+            check;
+        check = function () {
+            var top = win.scrollTop(),
+                height = win.height(),
+                margin = height * ns.LAZY_MARGIN,
+                visible = [],
+                near = [];
+            pending = pending.filter(function (div) {
+                var offset = $(div).offset().top,
+                    bottom = offset + $(div).height(),
+                    uid = ns.plotid(div);
+                if (offset <= top + height && bottom >= top) {
+                    visible.push(uid);
+                    return false;
+                }
+                if (offset <= top + height + margin && bottom >= top - margin) {
+                    near.push(uid);
+                    return false;
+                }
+                return true;
+            });
+            ns.fetchcharts(url, visible);
+            ns.fetchcharts(url, near);
+            if (!pending.length) {
+                win.off('.uuchartlazy');
+            }
+        };
+        win.on('scroll.uuchartlazy resize.uuchartlazy', $.throttle(200, check));
+        check();
+    };
+
+    ns.FEED_POLL = 10000;   // ms between polls of feed
+    ns.FEED_RETRY = 30000;  // ms before re-polling feed after error
+
+    /**
+     * watchreport(): subscribe to report change feed (Server-Sent Events
+     * if supported, otherwise polling), fetching and drawing only the
+     * changed charts (via refreshreport) when charts change.
+     */
+    ns.watchreport = function (feed_url, json_url) {
+        var source,
+            poll;
+        if (ns.report_version === null) {
+            // wait for first charts loaded, for report version seen
+            setTimeout(function () {
+                ns.watchreport(feed_url, json_url);
+            }, 1000);
+            return;
+        }
+        if (window.EventSource) {
+            // reconnects send Last-Event-ID, which server prefers to since
+            source = new window.EventSource(
+                feed_url + '?since=' + ns.report_version
+            );
+            source.addEventListener('changed', function () {
+                ns.refreshreport(json_url);
+            });
+            return;
+        }
+        poll = function () {
+            $.ajax({
+                url: feed_url + '?since=' + ns.report_version + ns.cachebust(),
+                dataType: 'json',
+                success: function (response) {
+                    if (response.changed.length) {
+                        ns.refreshreport(json_url);
+                    }
+                    setTimeout(poll, ns.FEED_POLL);
+                },
+                error: function () {
+                    setTimeout(poll, ns.FEED_RETRY);
+                }
+            });
+        };
+        poll();
+    };
+
     ns.loadcharts = function () {
-        var report_json_url = $('#report-core').attr('data-report-json');
+        var core = $('#report-core'),
+            report_json_url = core.attr('data-report-json'),
+            feed_url = core.attr('data-report-feed'),
+            lazy = core.attr('data-lazy-load');
         if (report_json_url) {
-            ns.loadreport(report_json_url);
+            if (lazy && $('.chartdiv').length > ns.LAZY_THRESHOLD) {
+                ns.lazyreport(report_json_url);
+            } else {
+                ns.loadreport(report_json_url);
+            }
+            if (feed_url) {
+                ns.watchreport(feed_url, report_json_url);
+            }
         } else {
             $('.chartdiv').each(function () {
                 var div = $(this),
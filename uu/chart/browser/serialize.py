@@ -28,6 +28,8 @@ Note: properties marked with multiplicity [0..1] either have a typed
 | goal : Number             [0..1]|   Common goal; omit if None or hidden.
 | goal_color : String       [0..1]|   include IFF configured, goal not hidden
 | x_axis_type : String      [0..1]|   Either 'date' or omitted.
+| categories : Array        [0..1]|   Named-series charts: names of all
+|                                 |     points in all series, in order.
 | legend_location : String  [0..1]|   null ==> hide legend
 | legend_placement : String [0..1]|
 | range_min : Number              |   (y-axis min/max)
@@ -58,9 +60,19 @@ Note: properties marked with multiplicity [0..1] either have a typed
 | show_trend : Boolean  [0..1]|     'true' or 'false' literal in JSON
 | trend_width : Number  [0..1]|
 | trend_color : String  [0..1]|     if empty, default same as color
+| trend : Object        [0..1]|     Linear fit, if show_trend: slope,
+|                             |       intercept (x: day ordinal, or 1..N
+|                             |       category), start/end [key, value]
+| stats : Object        [0..1]|     count, mean, stdev, min, max values
+| spc : Object          [0..1]|     Time-series chart SPC, if enabled:
+|                             |       method ('run' or 'xmr'), center,
+|                             |       ucl, lcl (xmr only), runs, and
+|                             |       signals: shifts, trends (run) or
+|                             |       outside (xmr) date keys/[start,end]
 | display_format:String [0..1]|     == '%%.%if' % display_precision
 | point_labels : String       |     Choices: 'defer' (def), 'show', 'omit'
 | break_lines : Boolean       |     'true'/'false': break time-series on null?
+| uid : String          [0..1]|     UUID of series content
 '-----------------------------'
        1 /%\
          \%/
@@ -95,18 +107,47 @@ Notes, enumerated choices:
     'outside'
     'tabular'
 
+ * Version: chart JSON has the 'version' of the chart it was rendered
+   at, if versions are tracked.
+
+ * Delta: report JSON requested with since=<version> (a report version
+   from an X-Report-Version response header) is an object with current
+   'version', 'uids' of all charts, and 'charts': (uid, chart) pairs for
+   only charts changed since.  Clients pass the charts they hold as
+   loaded=<uid>:<version>,... (version of each chart's data held), to
+   get only those charts, each changed since its own version.  Changed
+   charts known to the server at exactly the version held have 'delta':
+   true, 'series_order' (series UIDs), and only changed series, which
+   (if 'partial') have only changed points in data, and keys of
+   'removed' points; other changed charts are complete.
+
+ * Date window: time-series chart JSON may be requested with start
+   and/or end (YYYY-MM-DD) query parameters; series data then contains
+   only points in that (inclusive) window, and chart start/end are those
+   of the window.
+
 """
 
+import base64
 from datetime import date, datetime
 from fractions import Fraction
+import gzip
 import json
 import math
 import re
+from StringIO import StringIO
 
 from plone.uuid.interfaces import IUUID
+from Products.CMFCore.utils import getToolByName
 
-from uu.chart.interfaces import ITimeSeriesChart
+from uu.chart.cache import BoundedCache
+from uu.chart.content import PointIndex
+from uu.chart.dependencies import render_version, versions
+from uu.chart.interfaces import ITimeSeriesChart, IDataReport, CHART_TYPES
 from uu.chart.handlers import wfinfo
+from uu.chart.measureseries import MeasureExecutor
+from uu.chart import timing
+from uu.chart.timing import timed
 
 from datelabel import DateLabelView
 from report import ReportView
@@ -133,23 +174,175 @@ def isodate(dt):
     return stripms(dt.isoformat())
 
 
+# recently rendered chart data, for computing deltas: chart UID to list
+# of (render version, data) pairs, most recent last:
+HISTORY_DEPTH = 3       # versions kept per chart
+HISTORY_LIMIT = 500     # charts kept in history
+_history = BoundedCache(HISTORY_LIMIT)
+
+
+def remember(uid, version, data):
+    """Keep rendered data of chart at version, for later deltas"""
+    if version is None:
+        return
+    entries = [e for e in _history.get(uid, ()) if e[0] != version]
+    entries.append((version, data))
+    _history[uid] = sorted(entries, key=lambda e: e[0])[-HISTORY_DEPTH:]
+
+
+def recall(uid, version):
+    """Data of chart rendered at version, or None if unknown"""
+    for v, data in _history.get(uid, ()):
+        if v == version:
+            return data
+    return None
+
+
+def series_delta(old, new):
+    """
+    Delta of series dict from old to new: None if unchanged, new if
+    not comparable, else new with only changed points in data, and keys
+    of removed points in 'removed'.
+    """
+    if old == new:
+        return None
+    if old is None:
+        return new
+    previous = dict((key, point) for key, point in old['data'])
+    current = set(key for key, point in new['data'])
+    r = dict(new)
+    r['partial'] = True
+    r['data'] = [
+        (key, point) for key, point in new['data']
+        if previous.get(key) != point
+        ]
+    r['removed'] = [key for key in previous if key not in current]
+    return r
+
+
+def chart_delta(old, new):
+    """
+    Delta of chart data from old to new: new, with only changed series
+    (by series UID), and UIDs of all current series in 'series_order'.
+    """
+    if old is None or not all('uid' in s for s in new['series']):
+        return new
+    previous = dict((s.get('uid'), s) for s in old.get('series', ()))
+    r = dict(new)
+    r['delta'] = True
+    r['series_order'] = [s['uid'] for s in new['series']]
+    r['series'] = filter(
+        None,
+        [series_delta(previous.get(s['uid']), s) for s in new['series']],
+        )
+    return r
+
+
+def parse_loaded(value):
+    """
+    Parse loaded charts parameter, comma-separated uid:version items,
+    to list of (uid, version) pairs; version is None if missing or
+    invalid.  Returns None if value is empty.
+    """
+    if not value or not isinstance(value, basestring):
+        return None
+    result = []
+    for item in value.split(',')[:MAX_UIDS]:
+        uid, _, version = item.partition(':')
+        if not uid:
+            continue
+        try:
+            version = int(version)
+        except ValueError:
+            version = None
+        result.append((uid, version))
+    return result
+
+
+def parse_date(value):
+    """Parse ISO 8601 date (YYYY-MM-DD) string, or None if empty/invalid"""
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
 class ChartJSON(object):
-    """Adapter to create JSON for use by view"""
+    """
+    Adapter to create JSON for use by view; for time series charts,
+    optional start and end dates limit series data to a date window.
+    """
 
-    def __init__(self, context):
+    def __init__(self, context, start=None, end=None):
         self.context = context
         self.state = wfinfo(context)[0]
         self.show_uris = self.show_notes = self.state != 'published'
+        self.window = None
+        if (start or end) and ITimeSeriesChart.providedBy(context):
+            self.window = (start, end)
+
+    def _points(self, seq):
+        """Points of series, in date window if specified"""
+        if self.window is not None and hasattr(seq, 'points_between'):
+            return seq.points_between(*self.window)
+        return seq.data
    
-    def _series_list(self):
-        """Get all series represented as dict"""
+    def _key(self, key):
+        if isinstance(key, date) or isinstance(key, datetime):
+            return isodate(key)
+        return key
+
+    def _statistics(self, seq, series, categories=None):
+        """
+        Add summary statistics, trend (if shown) and SPC analysis (if
+        enabled on time-series chart) to series dict.
+        """
+        cached = seq._cached() if hasattr(seq, '_cached') else None
+        if cached is None:
+            cached = PointIndex(seq.data)
+        method = getattr(self.context, 'spc', None) or 'none'
+        if method != 'none' and categories is None:
+            with timed('spc'):
+                analysis = cached.spc(method)
+            if analysis is not None:
+                series['spc'] = self._spc(analysis)
+        with timed('stats'):
+            summary = cached.summary()
+            if summary is not None:
+                series['stats'] = summary
+            if not getattr(seq, 'show_trend', False):
+                return
+            trend = cached.trend(categories)
+            if trend is not None:
+                series['trend'] = {
+                    'slope': trend['slope'],
+                    'intercept': trend['intercept'],
+                    'start': [self._key(trend['start'][0]),
+                              trend['start'][1]],
+                    'end': [self._key(trend['end'][0]), trend['end'][1]],
+                    }
+
+    def _spc(self, analysis):
+        """Copy of SPC analysis, with keys of signals as date strings"""
+        r = dict(analysis)
+        for name in ('shifts', 'trends'):
+            if name in r:
+                r[name] = [map(self._key, pair) for pair in r[name]]
+        if 'outside' in r:
+            r['outside'] = map(self._key, r['outside'])
+        return r
+
+    def _series_list(self, categories=None):
+        """
+        Get all series represented as dict; categories are the names of
+        all points of a named-series chart, for positions in trend fit.
+        """
         r = []
         for seq in self.context.series():
             series = {}
             # series data is mapping of keys to point objects
-            series['data'] = list(
-                [(p['key'], p) for p in map(self._datapoint, seq.data)]
-                )
+            points = map(self._datapoint, self._points(seq))
+            series['data'] = [(p['key'], p) for p in points]
             if not series['data']:
                 continue  # omit series with no data from JSON output
             for name in (
@@ -175,6 +368,10 @@ class ChartJSON(object):
             # display format via display precision (digits after decimal pt)
             precision = getattr(seq, 'display_precision', 1)
             series['display_format'] = '%%.%if' % precision
+            uid = IUUID(seq, None)
+            if uid is not None:
+                series['uid'] = uid
+            self._statistics(seq, series, categories)
             r.append(series)
         return r
 
@@ -219,6 +416,7 @@ class ChartJSON(object):
             'end',
             ]
         context = self.context
+        MeasureExecutor(context).run()  # compute measure series data
         r = {
             'uid': IUUID(context),
             'url': context.absolute_url(),
@@ -226,14 +424,17 @@ class ChartJSON(object):
             }
         if ITimeSeriesChart.providedBy(context):
             chart_attrs = chart_attrs + timeseries_chart_attrs
-            label_view = DateLabelView(context)
-            included = label_view.included_dates()
             r['x_axis_type'] = 'date'
             r['auto_crop'] = True  # default, explcit value may disable
-            r['labels'] = dict(
-                (d.isoformat(), label_view.label_for(d)) for d in included
-                )
-        r['series'] = self._series_list()
+            with timed('labels'):
+                label_view = DateLabelView(context)
+                included = label_view.included_dates()
+                r['labels'] = dict(
+                    (d.isoformat(), label_view.label_for(d)) for d in included
+                    )
+        else:
+            r['categories'] = list(context.identities())
+        r['series'] = self._series_list(r.get('categories'))
         if context.chart_styles:
             r['css'] = context.chart_styles
         for name in chart_attrs:
@@ -245,11 +446,21 @@ class ChartJSON(object):
                     r[name] = isodate(v)
                 else:
                     r[name] = v
+        if self.window is not None:
+            # client domain is window (with chart start/end as fallback):
+            for name, value in zip(('start', 'end'), self.window):
+                if value is not None:
+                    r[name] = isodate(value)
         if not self.context.show_goal and r.get('goal', None):
             del(r['goal'])  # omit if show_goal is false
         if not self.context.show_goal and r.get('goal_color', None):
             del(r['goal_color'])  # superfluous if show_goal is false
         self._set_aspect_ratio(context, r)
+        version = render_version(context)
+        if version is not None:
+            r['version'] = version
+        if self.window is None:
+            remember(r['uid'], version, r)
         return r
     
     def _set_aspect_ratio(self, context, r):
@@ -267,13 +478,44 @@ class ChartJSON(object):
             r['aspect_ratio'] = [f.numerator, f.denominator]
     
     def render(self):
-        return json.dumps(self._chart(), indent=2)
+        data = self._chart()
+        with timed('json'):
+            return json.dumps(data, indent=2)
+
+
+MAX_UIDS = 100  # limit on charts requested by UID in one request
+
+
+def encode_cursor(position, uid):
+    """Opaque cursor token for next batch of report charts"""
+    return base64.urlsafe_b64encode('%s:%s' % (position, uid))
+
+
+def decode_cursor(token):
+    """Return (position, uid of last chart sent) for cursor token"""
+    if not token:
+        return 0, None
+    try:
+        position, uid = base64.urlsafe_b64decode(str(token)).split(':', 1)
+        return int(position), uid
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor: %s' % token)
 
 
 class ReportJSON(object):
     """
     Report JSON adapter, containing all data for all reports,
     keyed by the UID of each chart.
+
+    If a cursor is given to render(), output is an object containing an
+    array of (uid, chart) data as 'charts', and a 'cursor' token for the
+    next batch of charts (or null if no more charts remain); an empty
+    cursor requests the first batch.
+
+    If a sequence of chart UIDs is given to render(), output is the
+    (uid, chart) data array for only those (visible) charts, in order
+    requested; this is used by clients loading charts as they near the
+    viewport.
     """
 
     ELEMENT_TYPES = (
@@ -284,43 +526,311 @@ class ReportJSON(object):
     def __init__(self, context):
         self.context = context
 
+    def _view(self):
+        return ReportView(self.context, None)
+
     def _contained_charts(self, b_start=0, b_size=None):
-        visible = ReportView(self.context, None).chart_elements(
+        visible = self._view().chart_elements(
             types=self.ELEMENT_TYPES,
             b_start=b_start,
             b_size=b_size,
             )
         return visible
 
+    def _cursor_start(self, brains, cursor):
+        """Position of first chart after cursor, in (current) brains"""
+        position, uid = decode_cursor(cursor)
+        if uid is None:
+            return 0
+        if 0 < position <= len(brains) and brains[position - 1].UID == uid:
+            return position
+        # charts added, removed or re-ordered since cursor was made:
+        for idx, brain in enumerate(brains):
+            if brain.UID == uid:
+                return idx + 1
+        return position
+
     def getdata(self, chart):
         return (IUUID(chart), ChartJSON(chart)._chart())
 
-    def render(self, b_start=0, b_size=None, **kwargs):
+    def render_cursor(self, cursor, b_size=None):
+        brains = self._view().element_brains(self.ELEMENT_TYPES)
+        start = self._cursor_start(brains, cursor)
+        batch = brains[start:start + b_size] if b_size else brains[start:]
+        data = map(self.getdata, [brain.getObject() for brain in batch])
+        position = start + len(batch)
+        result = {
+            'charts': data,
+            'cursor': None,
+            }
+        if batch and position < len(brains):
+            result['cursor'] = encode_cursor(position, batch[-1].UID)
+        with timed('json'):
+            return json.dumps(result, indent=2)
+
+    def render_uids(self, uids):
+        """Render data for charts by UID, in order of UIDs given"""
+        uids = [uid for uid in uids if uid][:MAX_UIDS]
+        order = dict((uid, idx) for idx, uid in enumerate(uids))
+        brains = self._view().element_brains(self.ELEMENT_TYPES, uids=uids)
+        brains = sorted(brains, key=lambda brain: order.get(brain.UID))
+        data = map(self.getdata, [brain.getObject() for brain in brains])
+        with timed('json'):
+            return json.dumps(data, indent=2)
+
+    def render_since(self, since, loaded=None):
+        """
+        Render object with 'version' of report, 'charts' array of (uid,
+        chart delta) for charts changed since given report version, and
+        'uids' of all charts in report, in order.
+
+        If loaded (uid, version) pairs of charts held by client are
+        given, only those charts are rendered, each if changed since its
+        version, as a delta from data rendered at that version if known.
+        """
+        brains = self._view().element_brains(self.ELEMENT_TYPES)
+        uids = [brain.UID for brain in brains]
+        held = {}  # uid -> version of data held by client, if known
+        if loaded is not None:
+            held = dict(loaded)
+            brains = [brain for brain in brains if brain.UID in held]
+        chart_versions = versions(*[brain.UID for brain in brains])
+        if chart_versions is None:
+            changed = brains  # versions not tracked: all charts
+        else:
+            changed = [
+                brain for brain, version in zip(brains, chart_versions)
+                if version > (held.get(brain.UID) or since)
+                ]
+        data = []
+        for brain in changed:
+            uid, chart = self.getdata(brain.getObject())
+            old = recall(uid, held[uid]) if held.get(uid) else None
+            data.append((uid, chart_delta(old, chart)))
+        result = {
+            'version': render_version(self.context),
+            'charts': data,
+            'uids': uids,
+            }
+        with timed('json'):
+            return json.dumps(result, indent=2)
+
+    def render(self, b_start=0, b_size=None, cursor=None, uids=None,
+               since=None, loaded=None, **kwargs):
+        if since is not None:
+            return self.render_since(since, loaded)
+        if uids is not None:
+            return self.render_uids(uids)
+        if cursor is not None:
+            return self.render_cursor(cursor, b_size)
+        if not (b_start or b_size):
+            # whole report: render from (request-cached) snapshot
+            from snapshot import get_snapshot  # snapshot uses ChartJSON
+            return get_snapshot(self.context).report_json()
         charts = self._contained_charts(b_start, b_size)
         data = map(self.getdata, charts)
-        return json.dumps(data, indent=2)
+        with timed('json'):
+            return json.dumps(data, indent=2)
+
+
+GZIP_MIN_SIZE = 1024  # do not compress smaller payloads
+
+# compression level by payload size: (maximum size, level), ascending;
+# small payloads compress well at high levels, cheaply; large payloads
+# use faster levels, as time grows with size, ratio gain does not:
+GZIP_LEVELS = (
+    (64 * 1024, 9),
+    (1024 * 1024, 6),
+    )
+GZIP_LARGE_LEVEL = 1
+
+# compressed responses for anonymous views of published content, keyed
+# by (UID, render version, request parameters): (raw, gzipped or None)
+RESPONSE_LIMIT = 200  # responses kept in cache
+_responses = BoundedCache(RESPONSE_LIMIT)
+
+
+def gzip_level(size):
+    for maxsize, level in GZIP_LEVELS:
+        if size <= maxsize:
+            return level
+    return GZIP_LARGE_LEVEL
+
+
+def compress(data):
+    """Gzip data (str) at level for its size; None if below threshold"""
+    if len(data) < GZIP_MIN_SIZE:
+        return None
+    out = StringIO()
+    f = gzip.GzipFile(
+        fileobj=out,
+        mode='wb',
+        compresslevel=gzip_level(len(data)),
+        mtime=0,  # same bytes for same data
+        )
+    f.write(data)
+    f.close()
+    return out.getvalue()
 
 
 class ChartJSONView(object):
-    """Browser view for JSON representation of chart context"""
+    """
+    Browser view for JSON representation of chart context; if enabled,
+    timings of data pipeline stages are sent in a Server-Timing header.
+
+    Responses are gzip compressed (above GZIP_MIN_SIZE) for clients
+    accepting it; for anonymous users viewing published content, raw
+    and compressed responses are cached until the render version of
+    the context changes.
+    """
     
     def __init__(self, context, request):
         self.context = context
         self.request = request
-   
+
+    def render(self):
+        start = parse_date(self.request.get('start', ''))
+        end = parse_date(self.request.get('end', ''))
+        return ChartJSON(self.context, start, end).render()
+
+    def params(self):
+        """Request parameters affecting output"""
+        return (
+            parse_date(self.request.get('start', '')),
+            parse_date(self.request.get('end', '')),
+            )
+
+    def _cachekey(self):
+        """Key for cached response, or None if not cacheable"""
+        mtool = getToolByName(self.context, 'portal_membership')
+        if not mtool.isAnonymousUser():
+            return None
+        try:
+            if wfinfo(self.context)[0] != 'published':
+                return None
+        except ValueError:
+            return None  # unknown workflow
+        version = render_version(self.context)
+        if version is None:
+            return None
+        return (IUUID(self.context), version, self.params())
+
+    def _render(self):
+        """Render and compress, return (raw, gzipped or None)"""
+        timings = timing.start() if timing.ENABLED else None
+        try:
+            data = self.render()
+            with timed('gzip'):
+                compressed = compress(data)
+        finally:
+            if timings is not None:
+                timing.stop()
+        if timings is not None:
+            self.request.response.setHeader('Server-Timing', timings.header())
+        return data, compressed
+
     def __call__(self, *args, **kwargs):
-        self.request.response.setHeader('Content-type', 'application/json')
-        return ChartJSON(self.context).render()
+        response = self.request.response
+        key = self._cachekey()
+        cached = _responses.get(key) if key is not None else None
+        if cached is None:
+            cached = self._render()
+            if key is not None:
+                _responses[key] = cached
+        data, compressed = cached
+        response.setHeader('Content-type', 'application/json')
+        response.setHeader('Vary', 'Accept-Encoding')
+        accepted = self.request.getHeader('Accept-Encoding', '') or ''
+        if compressed is not None and 'gzip' in accepted:
+            response.setHeader('Content-Encoding', 'gzip')
+            data = compressed
+        response.setHeader('Content-length', str(len(data)))
+        return data
 
 
 class ReportJSONView(ChartJSONView):
 
-    def __call__(self, *args, **kwargs):
+    def render(self):
         adapter = ReportJSON(self.context)
         b_start = int(self.request.get('b_start', 0))
         b_size = int(self.request.get('b_size', 0)) or None
-        data = adapter.render(b_start, b_size)
-        self.request.response.setHeader('Content-type', 'application/json')
-        self.request.response.setHeader('Content-length', str(len(data)))
-        return data
+        cursor = self.request.get('cursor', None)
+        uids = self.request.get('uids', None)
+        if isinstance(uids, basestring):
+            uids = uids.split(',')
+        since = self.request.get('since', None)
+        try:
+            since = int(since) if since not in (None, '') else None
+        except ValueError:
+            since = None  # invalid token: full report
+        return adapter.render(
+            b_start,
+            b_size,
+            cursor=cursor,
+            uids=uids,
+            since=since,
+            loaded=parse_loaded(self.request.get('loaded', None)),
+            )
 
+    def params(self):
+        return tuple(
+            self.request.get(name, None)
+            for name in (
+                'b_start',
+                'b_size',
+                'cursor',
+                'uids',
+                'since',
+                'loaded',
+                )
+            )
+
+    def _cachekey(self):
+        """
+        Cached responses are also keyed by the charts visible to the
+        user, and their workflow states, so a chart made private (or
+        otherwise hidden) is never served from cache.
+        """
+        key = super(ReportJSONView, self)._cachekey()
+        if key is None:
+            return None
+        brains = ReportView(self.context, None).element_brains(CHART_TYPES)
+        return key + (tuple((b.UID, b.review_state) for b in brains),)
+
+    def __call__(self, *args, **kwargs):
+        version = render_version(self.context)
+        if version is not None:
+            # clients pass version seen as since, for deltas
+            self.request.response.setHeader('X-Report-Version', str(version))
+        return super(ReportJSONView, self).__call__(*args, **kwargs)
+
+
+class TimingView(object):
+    """
+    Debug view: render JSON for chart or report context with timings
+    recorded (regardless of UU_CHART_TIMING), return timings as JSON.
+    """
+
+    def __init__(self, context, request):
+        self.context = context
+        self.request = request
+
+    def timings(self):
+        if IDataReport.providedBy(self.context):
+            adapter = ReportJSON(self.context)
+        else:
+            adapter = ChartJSON(self.context)
+        timings = timing.start()
+        try:
+            data = adapter.render()
+        finally:
+            timing.stop()
+        result = timings.info()
+        result['size'] = len(data)
+        return result
+
+    def __call__(self, *args, **kwargs):
+        msg = json.dumps(self.timings(), indent=2)
+        self.request.response.setHeader('Content-type', 'application/json')
+        self.request.response.setHeader('Cache-Control', 'no-cache')
+        return msg
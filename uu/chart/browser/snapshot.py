@@ -0,0 +1,96 @@
+"""
+uu.chart.browser.snapshot -- read-only snapshot of a report, built in a
+single traversal of its contents.
+
+A snapshot holds the visible elements of a report (charts and pages, in
+order), and for each chart its JSON data (series data and styles, date
+labels, categories) and workflow state, each computed once.  Consumers
+(JSON views, static export of JSON and HTML) render from the snapshot
+instead of traversing the report again; chart data in a snapshot is
+shared, and must not be modified by consumers.
+"""
+
+from collections import namedtuple
+import json
+
+from plone.uuid.interfaces import IUUID
+from zope.annotation.interfaces import IAnnotations
+from zope.globalrequest import getRequest
+
+from uu.chart.handlers import wfinfo
+from uu.chart.interfaces import CHART_TYPES
+from uu.chart.timing import timed
+
+from report import ReportView
+from serialize import ChartJSON
+
+
+REQUEST_CACHE_KEY = 'uu.chart.snapshot'
+
+
+ChartSnapshot = namedtuple(
+    'ChartSnapshot',
+    ('uid', 'name', 'state', 'data', 'context'),
+    )
+
+
+class ReportSnapshot(object):
+    """Report elements, and data for its charts, from one traversal"""
+
+    def __init__(self, report):
+        self.context = report
+        self.uid = IUUID(report)
+        self.title = report.Title()
+        try:
+            self.state = wfinfo(report)[0]
+        except ValueError:
+            self.state = None  # report not in known workflow
+        elements, charts = [], []
+        with timed('snapshot'):
+            for brain in ReportView(report, None).element_brains():
+                content = brain.getObject()
+                elements.append(content)
+                if brain.portal_type in CHART_TYPES:
+                    adapter = ChartJSON(content)
+                    charts.append(
+                        ChartSnapshot(
+                            brain.UID,
+                            content.getId(),
+                            adapter.state,
+                            adapter._chart(),
+                            content,
+                            )
+                        )
+        self.elements = tuple(elements)
+        self.charts = tuple(charts)
+
+    def chart(self, uid):
+        """ChartSnapshot for chart UID, or None"""
+        for chart in self.charts:
+            if chart.uid == uid:
+                return chart
+        return None
+
+    def report_data(self):
+        """Array of (uid, chart data) pairs, as in report JSON"""
+        return [(chart.uid, chart.data) for chart in self.charts]
+
+    def report_json(self):
+        with timed('json'):
+            return json.dumps(self.report_data(), indent=2)
+
+    def chart_json(self, chart):
+        with timed('json'):
+            return json.dumps(chart.data, indent=2)
+
+
+def get_snapshot(report):
+    """Snapshot of report, cached for duration of current request"""
+    request = getRequest()
+    if request is None:
+        return ReportSnapshot(report)
+    cache = IAnnotations(request).setdefault(REQUEST_CACHE_KEY, {})
+    uid = IUUID(report)
+    if uid not in cache:
+        cache[uid] = ReportSnapshot(report)
+    return cache[uid]
@@ -7,41 +7,60 @@ from Products.statusmessages.interfaces import IStatusMessage
 from uu.chart.interfaces import STYLEBOOK_TYPE, CHART_TYPES, LINESTYLE_TYPE
 from uu.chart.interfaces import ILineDisplayCore
 from uu.chart.interfaces import IChartStyleBook
+from uu.chart.dependencies import update_chart
+from uu.chart.indexing import queue_reindex
+
+
+# catalog indexes (and metadata) affected by style changes:
+STYLE_INDEXES = ('modified',)
+
+_marker = object()
 
 
 def _clone_attrs(source, target, schema, exclude=()):
+    """Copy differing attribute values; return True if any changed"""
+    changed = False
     for name, field in getFieldsInOrder(schema):
         if name in exclude:
             continue
         v = getattr(source, name, field.default)
-        setattr(target, name, v)
+        if getattr(target, name, _marker) != v:
+            setattr(target, name, v)
+            changed = True
+    return changed
+
+
+def _changed(target):
+    target.notifyModified()
+    queue_reindex(target, STYLE_INDEXES)
 
 
 def clone_line_styles(source, target):
-    _clone_attrs(source, target, ILineDisplayCore)
-    target.reindexObject()
+    if _clone_attrs(source, target, ILineDisplayCore):
+        _changed(target)
+        return True
+    return False
 
 
 def clone_chart_styles(source, target):
     """
     Clone chart styles from source to target, where either may be
-    a stylebook or a chart.
+    a stylebook or a chart.  Only changed objects are reindexed, once,
+    at end of transaction; returns True if any style changed.
     """
-    _clone_attrs(
+    changed = _clone_attrs(
         source,
         target,
         IChartStyleBook,
         exclude=('x_label', 'y_label'),
         )
+    if changed:
+        _changed(target)
     source_lines = source.objectValues()
     target_lines = target.objectValues()
-    target.reindexObject()
-    for i in range(len(source_lines)):
-        if i >= len(target_lines):
-            break
-        source_line = source_lines[i]
-        target_line = target_lines[i]
-        clone_line_styles(source_line, target_line)
+    for source_line, target_line in zip(source_lines, target_lines):
+        changed = clone_line_styles(source_line, target_line) or changed
+    return changed
 
 
 class ReportStylesView(object):
@@ -108,10 +127,12 @@ class ReportStylesView(object):
                 )
             return
         for target in targets:
-            clone_chart_styles(stylebook, target)  # copy styles now
+            changed = clone_chart_styles(stylebook, target)  # copy now
             if do_bind:
                 bookuid = IUUID(stylebook, None)
                 target.stylebook = bookuid
+            if do_bind or changed:
+                update_chart(target)  # edges, and render version
         _listcharts = lambda s: ', '.join(['"%s"' % o.Title() for o in s])
         msg = 'Copied styles from' if not do_bind else 'Bound'
         self.status.addStatusMessage(
@@ -0,0 +1,38 @@
+"""
+uu.chart.cache -- bounded in-process caches of derived data (interned
+keys, sort keys, computed series, rendered responses), kept in module
+globals and shared by all threads of a process.
+"""
+
+from collections import deque
+
+
+class BoundedCache(dict):
+    """
+    Dict holding at most limit keys: adding a key beyond the limit
+    evicts the oldest added keys, first in, first out.  Lookups are
+    plain dict lookups, with no bookkeeping.
+    """
+
+    def __init__(self, limit):
+        super(BoundedCache, self).__init__()
+        self.limit = limit
+        self._order = deque()  # keys, in order added
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._order.append(key)
+            while len(self._order) > self.limit:
+                self.pop(self._order.popleft(), None)
+        dict.__setitem__(self, key, value)
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def clear(self):
+        dict.clear(self)
+        self._order.clear()
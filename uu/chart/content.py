@@ -1,6 +1,8 @@
+from bisect import bisect_left, bisect_right
 import csv
 from datetime import date
 from hashlib import md5
+import heapq
 from StringIO import StringIO
 
 from Acquisition import aq_base, aq_inner, aq_parent
@@ -8,7 +10,7 @@ from ComputedAttribute import ComputedAttribute
 from persistent.dict import PersistentDict
 from plone.dexterity.content import Item, Container
 from zope.interface import implements
-from plone.uuid.interfaces import IAttributeUUID
+from plone.uuid.interfaces import IAttributeUUID, IUUID
 
 from uu.smartdate.converter import normalize_usa_date
 
@@ -18,7 +20,9 @@ from uu.chart.interfaces import ITimeSeriesCollection
 from uu.chart.interfaces import INamedSeriesChart, INamedDataSequence
 from uu.chart.interfaces import TIME_DATA_TYPE, NAMED_DATA_TYPE
 from uu.chart.interfaces import MEASURE_DATA_TYPE
-from uu.chart.data import TimeSeriesDataPoint, NamedDataPoint
+from uu.chart.interfaces import point_identity_key
+from uu.chart.data import TimeSeriesDataPoint, NamedDataPoint, intern_key
+from uu.chart import spc, stats
 
 
 _type_filter = lambda o, t: hasattr(o, 'portal_type') and o.portal_type == t
@@ -32,20 +36,114 @@ def computed_attribute(level=0):
     return computed_attribute_wrapper
 
 
-def filter_data(context, points):
+def crop_window(context):
+    """
+    (start, end) dates to crop time series data to, if the chart
+    containing context forces crop; otherwise None.
+    """
     parent = aq_parent(aq_inner(context))
     if ITimeSeriesCollection.providedBy(parent):
         if getattr(parent, 'force_crop', False):
-            start, end = parent.start, parent.end
-            if parent.start:
-                _after_start = lambda p: p.date >= parent.start
-                points = filter(_after_start, points)
-            if parent.end:
-                _before_end = lambda p: p.date <= parent.end
-                points = filter(_before_end, points)
+            return (parent.start, parent.end)
+    return None
+
+
+def date_window(points, start=None, end=None):
+    """
+    Points (sorted by date) with start <= date <= end, found by bisection;
+    start or end of None is unbounded.
+    """
+    keys = [p.date for p in points]
+    lo = bisect_left(keys, start) if start else 0
+    hi = bisect_right(keys, end) if end else len(keys)
+    return points[lo:hi]
+
+
+def filter_data(context, points):
+    window = crop_window(context)
+    if window is not None and (window[0] or window[1]):
+        points = sorted(points, key=lambda p: p.date)  # stable
+        points = date_window(points, *window)
     return points
 
 
+class PointIndex(object):
+    """
+    Data points of a sequence, with identity to point index and list of
+    unique keys, both built lazily on first use.
+    """
+
+    __slots__ = (
+        'points',
+        '_index',
+        '_keys',
+        '_summary',
+        '_trend',
+        '_spc',
+        '_dates',
+        )
+
+    def __init__(self, points):
+        self.points = points
+        self._index = self._keys = self._summary = self._trend = None
+        self._spc = self._dates = None
+
+    def _build(self):
+        index, keys = {}, []
+        for point in self.points:
+            key = point.identity()
+            if key not in index:
+                index[key] = point  # first point for key
+                keys.append(key)
+        self._index, self._keys = index, keys
+
+    def point_for(self, key, default=None):
+        if self._index is None:
+            self._build()
+        return self._index.get(key, default)
+
+    def keys(self):
+        if self._keys is None:
+            self._build()
+        return self._keys
+
+    def points_between(self, start=None, end=None):
+        """
+        Time series points with start <= date <= end, by bisection of
+        date-sorted points (sorted once); None start/end is unbounded.
+        """
+        if self._dates is None:
+            ordered = sorted(self.points, key=lambda p: p.date)
+            self._dates = ([p.date for p in ordered], ordered)
+        keys, ordered = self._dates
+        lo = bisect_left(keys, start) if start else 0
+        hi = bisect_right(keys, end) if end else len(keys)
+        return ordered[lo:hi]
+
+    def summary(self):
+        """Summary statistics of point values (computed once)"""
+        if self._summary is None:
+            self._summary = stats.summary(p.value for p in self.points)
+        return self._summary
+
+    def trend(self, categories=None):
+        """Linear trend (computed once per distinct categories)"""
+        if self._trend is None or self._trend[0] != categories:
+            self._trend = (
+                categories,
+                stats.trend(self.points, categories),
+                )
+        return self._trend[1]
+
+    def spc(self, method):
+        """SPC analysis of (date-ordered) points by method, memoized"""
+        if self._spc is None:
+            self._spc = {}
+        if method not in self._spc:
+            self._spc[method] = spc.analyze(self.points, method)
+        return self._spc[method]
+
+
 class BaseDataSequence(Item):
    
     POINTCLS = None
@@ -61,6 +159,10 @@ class BaseDataSequence(Item):
         result = []
         reader = csv.reader(StringIO(getattr(self, 'input', u'')))
         rows = list(reader)  # iterate over CSV
+        # date keys are validated by point constructor, names are trusted:
+        pointcls = self.POINTCLS
+        if self.KEYTYPE != date:
+            pointcls = self.POINTCLS.trusted
         for row in rows:
             note = uri = None  # default empty optional values
             if len(row) < 2:
@@ -69,6 +171,8 @@ class BaseDataSequence(Item):
                 key = row[0]
                 if self.KEYTYPE == date:
                     key = normalize_usa_date(key)
+                else:
+                    key = intern_key(key)
                 value = float(row[1])
             except ValueError:
                 continue  # failed to type-cast value, ignore row
@@ -76,23 +180,47 @@ class BaseDataSequence(Item):
                 note = row[2]
             if len(row) >= 4:
                 uri = row[3]
-            result.append(self.POINTCLS(key, value, note, uri))
+            result.append(pointcls(key, value, note, uri))
         if filtered and not excluded:
             result = filter_data(self, result)
         if excluded:
-            included = filter_data(self, result)
+            included = set(filter_data(self, result))
             result = [p for p in result if p not in included]
         return result
 
+    def _cachekey(self):
+        """Key for cached data, changes when data source changes"""
+        source = getattr(self, 'input', None) or ''
+        if isinstance(source, unicode):
+            source = source.encode('utf-8')
+        return (md5(source).hexdigest(), crop_window(self))
+
+    def _cached(self):
+        """Get PointIndex for data, cached until cache key changes"""
+        cachekey = self._cachekey()
+        cache = getattr(aq_base(self), '_v_data', None)
+        if cache is None or cachekey not in cache:
+            cache = self._v_data = {
+                cachekey: PointIndex(self._data(filtered=True)),
+                }
+        return cache[cachekey]
+
     @computed_attribute(level=1)
     def data(self):
         """Parse self.input, return list of point objects"""
-        if not hasattr(self, '_v_data'):
-            self._v_data = {}
-        cachekey = md5(self.input).hexdigest()
-        if cachekey not in self._v_data:
-            self._v_data[cachekey] = self._data(filtered=True)
-        return self._v_data[cachekey]
+        return self._cached().points
+
+    def point_for(self, key, default=None):
+        """Data point for identity (date or name) key, or default"""
+        return self._cached().point_for(key, default)
+
+    def keys(self):
+        """Unique point identities, in order of data"""
+        return self._cached().keys()
+
+    def points_between(self, start=None, end=None):
+        """Time series points in date window (inclusive), date order"""
+        return self._cached().points_between(start, end)
 
     def excluded(self):
         return self._data(excluded=True)
@@ -128,7 +256,56 @@ class TimeDataSequence(BaseDataSequence):
         self.label_overrides = PersistentDict()
 
 
-class TimeSeriesChart(Container):
+class BaseChart(Container):
+    """Base for charts: collection of data series"""
+
+    def _series_versions(self, series):
+        """
+        Versions of data of series: the (cached) PointIndex of each, by
+        identity; measure data changes without changing cache keys of
+        providers, but always yields a new PointIndex.
+        """
+        return tuple(
+            (IUUID(seq, None), seq._cached()) for seq in series
+            )
+
+    def _merged_identities(self, series):
+        """
+        K-way merge of sorted keys of each series, by identity collation,
+        skipping duplicate keys (keeping key of first series having it).
+        Keys are decorated with series index, so keys collating equal
+        (e.g. a date and datetime) are never compared to each other.
+        """
+        sortkey = point_identity_key
+        merged = heapq.merge(*[
+            sorted((sortkey(k), idx, k) for k in seq.keys())
+            for idx, seq in enumerate(series)
+            ])
+        result = []
+        last = None
+        for decorated, idx, key in merged:
+            if last is None or decorated != last:
+                result.append(key)
+            last = decorated
+        return result
+
+    def identities(self):
+        """
+        Sorted, unique point identities of all points in all series,
+        cached until data of any series changes.
+        """
+        series = self.series()
+        versions = self._series_versions(series)
+        cached = getattr(aq_base(self), '_v_identities', None)
+        if cached is None or cached[0] != versions:
+            cached = self._v_identities = (
+                versions,
+                self._merged_identities(series),
+                )
+        return cached[1]
+
+
+class TimeSeriesChart(BaseChart):
     implements(ITimeSeriesChart, IAttributeUUID)
     
     def series(self):
@@ -151,7 +328,7 @@ class NamedDataSequence(BaseDataSequence):
     KEYTYPE = unicode
 
 
-class NamedSeriesChart(Container):
+class NamedSeriesChart(BaseChart):
     implements(INamedSeriesChart, IAttributeUUID)
     
     def __init__(self, id=None, *args, **kwargs):
@@ -170,6 +347,21 @@ class NamedSeriesChart(Container):
         v1 = list(filter(_f, contained))
         return v1 + list(filter(_f_measure, contained))
 
+    def _merged_identities(self, series):
+        """
+        Named categories are kept in the order given by series data (in
+        order of first appearance), rather than sorted, so that charts
+        keep their author's category order.
+        """
+        seen = set()
+        result = []
+        for seq in series:
+            for key in seq.keys():
+                if key not in seen:
+                    seen.add(key)
+                    result.append(key)
+        return result
+
 
 class DataReport(Container):
     implements(IDataReport, IAttributeUUID)
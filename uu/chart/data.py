@@ -2,25 +2,57 @@ import datetime
 
 from zope.interface import implements
 
+from uu.chart.cache import BoundedCache
 from uu.chart.interfaces import INamedDataPoint, ITimeSeriesDataPoint
 
 
+# intern table: equal keys (dates, names) across series share one object
+INTERN_LIMIT = 100000  # keys kept in table
+_interned = BoundedCache(INTERN_LIMIT)
+
+
+def intern_key(key):
+    """Return canonical (shared) instance of an equal point key"""
+    try:
+        return _interned[key]
+    except KeyError:
+        _interned[key] = key
+        return key
+
+
 class BaseDataPoint(object):
+
+    __slots__ = ('value', 'note', 'uri')
+
     def __init__(self, value, note=None, uri=None):
         self.value = value
         self.note = note
         self.uri = uri
-    
+
     def identity(self):
         raise NotImplementedError('base class does not provide')
 
 
 class NamedDataPoint(BaseDataPoint):
     implements(INamedDataPoint)
-    
+
+    __slots__ = ('name',)
+
     def __init__(self, name, value, note=None, uri=None):
-        self.name = name
-        super(NamedDataPoint, self).__init__(value, note, uri)
+        self.name = intern_key(name)
+        self.value = value
+        self.note = note
+        self.uri = uri
+
+    @classmethod
+    def trusted(cls, name, value, note=None, uri=None):
+        """Construct without validation, for already-parsed name key"""
+        point = cls.__new__(cls)
+        point.name = name
+        point.value = value
+        point.note = note
+        point.uri = uri
+        return point
 
     def identity(self):
         return self.name
@@ -28,15 +60,29 @@ class NamedDataPoint(BaseDataPoint):
 
 class TimeSeriesDataPoint(BaseDataPoint):
     implements(ITimeSeriesDataPoint)
-    
+
+    __slots__ = ('date',)
+
     def __init__(self, date, value, note=None, uri=None):
-        if isinstance(date, datetime.datetime):
-            date = date.date()
-        if not isinstance(date, datetime.date):
-            raise ValueError('date must be datetime.date object')
-        self.date = date
-        super(TimeSeriesDataPoint, self).__init__(value, note, uri)
+        if type(date) is not datetime.date:
+            if isinstance(date, datetime.datetime):
+                date = date.date()
+            if not isinstance(date, datetime.date):
+                raise ValueError('date must be datetime.date object')
+        self.date = intern_key(date)
+        self.value = value
+        self.note = note
+        self.uri = uri
+
+    @classmethod
+    def trusted(cls, date, value, note=None, uri=None):
+        """Construct without validation, for already-parsed date key"""
+        point = cls.__new__(cls)
+        point.date = date
+        point.value = value
+        point.note = note
+        point.uri = uri
+        return point
 
     def identity(self):
         return self.date
-
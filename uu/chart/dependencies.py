@@ -0,0 +1,240 @@
+"""
+uu.chart.dependencies -- persistent dependency graph of charts on the
+objects they use (measures, datasets, stylebooks), with a render version
+counter per chart and report.
+
+Modification of a source object bumps the render version of exactly
+the charts depending on it (and of their reports); so do workflow
+transitions of a chart.  Workflow transitions of a report, and changes
+to its contents (adding, removing or reordering elements) bump the
+version of the report.  Changes to forms bump charts using datasets
+that may contain them (see uu.chart.materialize).  Caches of rendered
+chart output should include render_version() in their keys.
+"""
+
+from Acquisition import aq_base, aq_inner, aq_parent
+from BTrees.OOBTree import OOBTree, OOTreeSet
+from persistent import Persistent
+from plone.uuid.interfaces import IUUID
+from Products.CMFCore.utils import getToolByName
+from zope.annotation.interfaces import IAnnotations
+from zope.component.hooks import getSite
+
+from uu.chart import feed
+from uu.chart.interfaces import IBaseChart, IDataReport
+from uu.chart.interfaces import IMeasureSeriesProvider
+from uu.chart.interfaces import TIMESERIES_TYPE, NAMEDSERIES_TYPE
+
+
+ANNOTATION_KEY = 'uu.chart.dependencies'
+
+
+class DependencyGraph(Persistent):
+    """Source UID -> dependent chart UIDs, and render versions"""
+
+    def __init__(self):
+        self.dependents = OOBTree()  # source UID -> OOTreeSet chart UIDs
+        self.sources = OOBTree()     # chart UID -> tuple of source UIDs
+        self.reports = OOBTree()     # chart UID -> report UID
+        self.versions = OOBTree()    # chart or report UID -> int
+
+    def update(self, chart_uid, sources, report_uid=None):
+        """Set sources used by chart, replacing any previous edges"""
+        sources = tuple(sorted(set(uid for uid in sources if uid)))
+        previous = self.sources.get(chart_uid, ())
+        if sources == previous and report_uid == self.reports.get(chart_uid):
+            return
+        for uid in set(previous) - set(sources):
+            self._unlink(uid, chart_uid)
+        for uid in set(sources) - set(previous):
+            if uid not in self.dependents:
+                self.dependents[uid] = OOTreeSet()
+            self.dependents[uid].insert(chart_uid)
+        self.sources[chart_uid] = sources
+        if report_uid is not None:
+            self.reports[chart_uid] = report_uid
+
+    def _unlink(self, uid, chart_uid):
+        charts = self.dependents.get(uid)
+        if charts is None:
+            return
+        if chart_uid in charts:
+            charts.remove(chart_uid)
+        if not charts:
+            del self.dependents[uid]
+
+    def bump_report(self, report_uid, chart_uid=None):
+        """Increment render version of report; return new version"""
+        report_version = self.versions.get(report_uid, 0) + 1
+        self.versions[report_uid] = report_version
+        feed.changed(report_uid, report_version, chart_uid)
+        return report_version
+
+    def remove(self, chart_uid):
+        """Remove chart from graph (bumping version of its report)"""
+        report_uid = self.reports.get(chart_uid)
+        if report_uid is not None:
+            self.bump_report(report_uid, chart_uid)
+        for uid in self.sources.get(chart_uid, ()):
+            self._unlink(uid, chart_uid)
+        for mapping in (self.sources, self.reports, self.versions):
+            if chart_uid in mapping:
+                del mapping[chart_uid]
+
+    def dependents_of(self, *uids):
+        """Chart UIDs depending on all of the given source UIDs"""
+        result = None
+        for uid in uids:
+            charts = set(self.dependents.get(uid, ()))
+            result = charts if result is None else result & charts
+        return sorted(result or ())
+
+    def version(self, uid):
+        return self.versions.get(uid, 0)
+
+    def bump(self, chart_uid):
+        """
+        Increment render version of report containing chart, and set
+        version of chart to it: report versions are a sequence, and
+        charts changed since a report version have greater versions.
+        """
+        version = self.versions.get(chart_uid, 0) + 1
+        report_uid = self.reports.get(chart_uid)
+        if report_uid is not None:
+            report_version = self.bump_report(report_uid, chart_uid)
+            version = max(version, report_version)
+        self.versions[chart_uid] = version
+
+    def invalidate(self, *uids):
+        """
+        Bump render versions of charts depending on all of the given
+        source UIDs; return their UIDs.
+        """
+        charts = self.dependents_of(*uids)
+        for chart_uid in charts:
+            self.bump(chart_uid)
+        return charts
+
+
+def get_graph(site=None, create=True):
+    site = site or getSite()
+    annotations = IAnnotations(site)
+    if ANNOTATION_KEY not in annotations:
+        if not create:
+            return None
+        annotations[ANNOTATION_KEY] = DependencyGraph()
+    return annotations[ANNOTATION_KEY]
+
+
+def render_version(context):
+    """
+    Render version of chart or report; changes when its output may.
+    None if versions are not (yet) tracked, so output is not cacheable.
+    """
+    graph = get_graph(create=False)
+    if graph is None:
+        return None
+    return graph.version(IUUID(context))
+
+
+def versions(*uids):
+    """Render versions for UIDs, or None if versions are not tracked"""
+    graph = get_graph(create=False)
+    if graph is None:
+        return None
+    return [graph.version(uid) for uid in uids]
+
+
+def chart_sources(chart):
+    """UIDs of objects (stylebook, measures, datasets) used by chart"""
+    sources = [getattr(chart, 'stylebook', None)]
+    for seq in chart.series():
+        if IMeasureSeriesProvider.providedBy(seq):
+            sources.append(getattr(seq, 'measure', None))
+            sources.append(getattr(seq, 'dataset', None))
+    return sources
+
+
+def _chart_for(context):
+    if IBaseChart.providedBy(context):
+        return context
+    parent = aq_parent(aq_inner(context))
+    if IBaseChart.providedBy(parent):
+        return parent
+    return None
+
+
+def update_chart(chart, bump=True):
+    """Update edges for chart, and (by default) bump its render version"""
+    parent = aq_parent(aq_inner(chart))
+    report_uid = None
+    if IDataReport.providedBy(parent):
+        report_uid = IUUID(parent, None)
+    graph = get_graph()
+    graph.update(IUUID(chart), chart_sources(chart), report_uid)
+    if bump:
+        graph.bump(IUUID(chart))
+
+
+def rebuild(site):
+    """(Re)build graph edges for all charts in site"""
+    catalog = getToolByName(site, 'portal_catalog')
+    brains = catalog.unrestrictedSearchResults(
+        {'portal_type': (TIMESERIES_TYPE, NAMEDSERIES_TYPE)}
+        )
+    for brain in brains:
+        update_chart(brain._unrestrictedGetObject(), bump=False)
+
+
+def upgrade_build_graph(context):
+    """Upgrade step: build dependency graph for existing charts"""
+    rebuild(getToolByName(context, 'portal_url').getPortalObject())
+
+
+def handle_chart_modified(context, event):
+    """Chart, or series within it, added or modified"""
+    chart = _chart_for(context)
+    if chart is not None:
+        update_chart(chart)
+
+
+def handle_chart_removed(context, event):
+    """Chart, or series within it, removed"""
+    graph = get_graph(create=False)
+    if graph is None:
+        return
+    if IBaseChart.providedBy(context):
+        graph.remove(IUUID(context))
+        return
+    chart = _chart_for(event.oldParent) if event.oldParent else None
+    if chart is None:
+        return
+    parent = aq_parent(aq_inner(chart))
+    current = parent.get(chart.getId()) if parent is not None else None
+    if aq_base(current) is not aq_base(chart):
+        return  # chart itself is being removed
+    update_chart(chart)
+
+
+def handle_chart_transition(context, event):
+    """Chart workflow transition: changes visibility of chart data"""
+    update_chart(context)
+
+
+def handle_report_changed(context, event):
+    """
+    Report workflow transition, or contents added, removed or reordered:
+    bump report version.
+    """
+    uid = IUUID(context, None)
+    if uid is not None:
+        get_graph().bump_report(uid)
+
+
+def handle_source_modified(context, event):
+    """Any object modified: invalidate charts depending on it, if any"""
+    graph = get_graph(create=False)
+    uid = IUUID(context, None)
+    if graph is None or uid is None or uid not in graph.dependents:
+        return
+    graph.invalidate(uid)
@@ -0,0 +1,71 @@
+"""
+uu.chart.feed -- in-process log of report changes, for the report
+change feed view (polling or Server-Sent Events).
+
+  * When the dependency graph bumps the version of a report (because a
+    chart in it, or a source of such a chart, changed), the change is
+    logged after the transaction commits (never for aborted
+    transactions).
+
+  * Each report keeps a short log of (version, chart UID) changes, so
+    feed requests can report charts changed after their connection's
+    view of the database (as of request start) without waiting.  Logs
+    are kept for at most LOG_REPORTS recently changed reports.
+
+Changes committed by other processes (ZEO clients) are not logged here;
+the next feed request reads them from the database.
+"""
+
+import threading
+
+import transaction
+
+from uu.chart.cache import BoundedCache
+
+
+LOG_LENGTH = 100      # changes kept per report
+LOG_REPORTS = 1000    # reports with changes kept
+
+_lock = threading.Lock()
+_local = threading.local()
+
+# report UID -> list of (version, chart UID), ascending:
+_logs = BoundedCache(LOG_REPORTS)
+
+
+def _announce(status, changes):
+    if not status:
+        return  # transaction aborted
+    with _lock:
+        for report_uid, version, chart_uid in changes:
+            log = _logs.get(report_uid, [])
+            log.append((version, chart_uid))
+            _logs[report_uid] = log[-LOG_LENGTH:]
+
+
+def changed(report_uid, version, chart_uid=None):
+    """Queue logging of report change, on commit of transaction"""
+    txn = transaction.get()
+    if getattr(_local, 'txn', None) is not txn:
+        _local.txn = txn
+        _local.changes = []
+        txn.addAfterCommitHook(_announce, (_local.changes,))
+    _local.changes.append((report_uid, version, chart_uid))
+
+
+def changes_since(report_uid, since):
+    """
+    Return (version, chart UIDs) of logged changes to report after
+    version since; version is None if there are none.
+    """
+    with _lock:
+        log = list(_logs.get(report_uid, ()))
+    entries = [e for e in log if e[0] > since]
+    if not entries:
+        return None, []
+    uids = []
+    for version, chart_uid in entries:
+        if chart_uid is not None and chart_uid not in uids:
+            uids.append(chart_uid)
+    return entries[-1][0], uids
+
@@ -1,5 +1,17 @@
+from Acquisition import aq_base
 from Products.CMFCore.utils import getToolByName
 
+from uu.chart.dependencies import update_chart
+from uu.chart.indexing import queue_reindex
+from uu.chart.interfaces import IBaseChart
+
+
+# indexes affected by a workflow transition (state, role mappings):
+WORKFLOW_INDEXES = ('review_state', 'allowedRolesAndUsers')
+
+# indexes affected by (acquired) permission changes:
+SECURITY_INDEXES = ('allowedRolesAndUsers',)
+
 
 def wfinfo(context):
     wftool = getToolByName(context, 'portal_workflow')
@@ -14,32 +26,123 @@ def wfinfo(context):
 def publish(context, message=None, ignore_states=()):
     message = 'Publishing item' + (': %s' % message if message else '')
     state, wftool = wfinfo(context)
-    transition = lambda o, t: wftool.doActionFor(o, t, comment=message)
-    if state == 'published' or state in ignore_states:
+    if state in ignore_states:
         return
-    if state == 'collaborative_editing':
-        transition(context, 'end_collaboration')
-    elif state not in ('pending', 'archived', 'visible'):
-        transition(context, 'share')
-    transition(context, 'publish')
+    for transition in publish_transitions(state):
+        wftool.doActionFor(context, transition, comment=message)
 
 
 def unpublish(context, message):
     message = 'Un-publishing item' + (': %s' % message if message else '')
     state, wftool = wfinfo(context)
-    transition = lambda o, t: wftool.doActionFor(o, t, comment=message)
+    for transition in unpublish_transitions(state):
+        wftool.doActionFor(context, transition, comment=message)
+
+
+def publish_transitions(state):
+    """Transitions (in order) to publish content in given state"""
+    if state == 'published':
+        return ()
+    if state == 'collaborative_editing':
+        return ('end_collaboration', 'publish')
+    if state not in ('pending', 'archived', 'visible'):
+        return ('share', 'publish')
+    return ('publish',)
+
+
+def unpublish_transitions(state):
+    """Transitions to return content in given state for editing"""
     if state == 'published':
-        transition(context, 'return_for_editing')
+        return ('return_for_editing',)
+    return ()
+
+
+class WorkflowCascade(object):
+    """
+    Bulk cascade of publish/unpublish to all content contained (at any
+    depth) in a report or chart: transitions for the whole subtree are
+    planned first, then applied directly via the workflow definition,
+    without firing nested IActionSucceededEvent (which would cascade
+    again), and with one reindex per object of workflow indexes only,
+    queued for end of transaction.  Content not transitioned may still
+    acquire changed permissions, so security indexes of all content in
+    the subtree are reindexed too.  Render versions of transitioned
+    charts are bumped, as their visibility changed.
+    """
+
+    def __init__(self, context, publish=True, message=None):
+        self.context = context
+        self.publish = publish
+        self.message = message
+        self.wftool = getToolByName(context, 'portal_workflow')
+        self._workflows = {}  # portal_type -> workflow definition
+
+    def workflow(self, content):
+        portal_type = content.portal_type
+        if portal_type not in self._workflows:
+            wfinfo(content)  # validate workflow conventions
+            chain = self.wftool.getChainFor(content)[0]
+            self._workflows[portal_type] = self.wftool.getWorkflowById(chain)
+        return self._workflows[portal_type]
+
+    def transitions(self, content):
+        wf = self.workflow(content)
+        state = self.wftool.getStatusOf(wf.getId(), content)['review_state']
+        if not self.publish:
+            return wf, unpublish_transitions(state)
+        if state == 'private':
+            return wf, ()
+        return wf, publish_transitions(state)
+
+    def plan(self, context=None):
+        """
+        Return list of (content, workflow, transitions) for subtree,
+        depth-first; like the per-event cascade, content within an item
+        is only included if that item is transitioned itself.
+        """
+        context = context if context is not None else self.context
+        result = []
+        for content in context.contentValues():
+            wf, transitions = self.transitions(content)
+            if not transitions:
+                continue
+            result.append((content, wf, transitions))
+            if hasattr(aq_base(content), 'contentValues'):
+                result.extend(self.plan(content))
+        return result
+
+    def descendants(self, context=None):
+        """All content in subtree, depth-first"""
+        context = context if context is not None else self.context
+        result = []
+        for content in context.contentValues():
+            result.append(content)
+            if hasattr(aq_base(content), 'contentValues'):
+                result.extend(self.descendants(content))
+        return result
+
+    def __call__(self):
+        """Apply planned transitions; return count of content changed"""
+        plan = self.plan()
+        for content, wf, transitions in plan:
+            for transition in transitions:
+                wf.doActionFor(content, transition, comment=self.message)
+            queue_reindex(content, WORKFLOW_INDEXES)
+            if IBaseChart.providedBy(content):
+                update_chart(content)
+        for content in self.descendants():
+            queue_reindex(content, SECURITY_INDEXES)  # merged if queued
+        return len(plan)
 
 
 def publish_children(context, message):
-    for content in context.contentValues():
-        publish(content, message, ignore_states=('private',))
+    message = 'Publishing item' + (': %s' % message if message else '')
+    return WorkflowCascade(context, publish=True, message=message)()
 
 
 def unpublish_children(context, message):
-    for content in context.contentValues():
-        unpublish(content, message)
+    message = 'Un-publishing item' + (': %s' % message if message else '')
+    return WorkflowCascade(context, publish=False, message=message)()
 
 
 def after_chart_transition(context, event):
@@ -54,8 +157,8 @@ def after_chart_transition(context, event):
 
 def after_report_transition(context, event):
     """Handler for (IDataReport, IActionSucceededEvent)"""
-    # note, publising children (charts) will fire its own events
-    # to affect items within those charts, such as series.
+    # note, publishing children cascades to content within charts (such
+    # as series) in bulk, without firing events for each chart.
     if event.action == 'publish':
         message = 'publishing report components with report.'
         publish_children(context, message=message)
@@ -63,4 +166,3 @@ def after_report_transition(context, event):
         message = 'returning any published components in report '\
                   'to the Shared with Workgroup state.'
         unpublish_children(context, message=message)
-
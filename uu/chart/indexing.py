@@ -0,0 +1,92 @@
+"""
+uu.chart.indexing -- per-transaction queue of catalog reindexing and
+deferred operations, run once, before transaction commit.
+
+  * queue_reindex() merges repeated requests to reindex the same object
+    within a transaction: named indexes are combined, and a request for
+    a full reindex (no named indexes) supersedes named ones.
+
+  * defer() queues a callable to run once per key in a transaction;
+    deferring again with the same key replaces the queued arguments, so
+    repeated events (e.g. edits to a stylebook and each of its line
+    styles) merge into one operation.  Deferred calls run before queued
+    reindexing, and may queue reindexing themselves.
+"""
+
+import threading
+
+from Acquisition import aq_base
+import transaction
+
+
+_local = threading.local()
+
+
+class IndexQueue(object):
+    """Reindex requests and deferred calls for one transaction"""
+
+    def __init__(self):
+        self.deferred = {}      # key -> (func, args)
+        self.order = []         # deferred keys, in order first queued
+        self.reindex = {}       # id(obj) -> [obj, set of index names]
+
+    def defer(self, key, func, *args):
+        if key not in self.deferred:
+            self.order.append(key)
+        self.deferred[key] = (func, args)
+
+    def queue(self, obj, idxs=()):
+        key = id(aq_base(obj))
+        if key not in self.reindex:
+            self.reindex[key] = [obj, set(idxs) if idxs else None]
+            return
+        names = self.reindex[key][1]
+        if names is None or not idxs:
+            self.reindex[key][1] = None  # full reindex
+        else:
+            names.update(idxs)
+
+    def flush(self):
+        while self.order:
+            key = self.order.pop(0)
+            func, args = self.deferred.pop(key)
+            func(*args)
+        entries, self.reindex = self.reindex.values(), {}
+        for obj, names in entries:
+            if names is None:
+                obj.reindexObject()
+            else:
+                obj.reindexObject(idxs=sorted(names))
+
+
+def _flush(queue):
+    queue.flush()
+    if getattr(_local, 'queue', None) is queue:
+        _local.txn = _local.queue = None
+
+
+def get_queue():
+    """Return IndexQueue for current transaction"""
+    txn = transaction.get()
+    if getattr(_local, 'txn', None) is not txn:
+        _local.txn = txn
+        _local.queue = IndexQueue()
+        txn.addBeforeCommitHook(_flush, (_local.queue,))
+    return _local.queue
+
+
+def queue_reindex(obj, idxs=()):
+    """Reindex obj (only named indexes, if given) before commit"""
+    get_queue().queue(obj, idxs)
+
+
+def defer(key, func, *args):
+    """Call func(*args) once per key, before commit"""
+    get_queue().defer(key, func, *args)
+
+
+def flush():
+    """Run deferred calls and reindexing queued so far, now"""
+    queue = getattr(_local, 'queue', None)
+    if queue is not None and _local.txn is transaction.get():
+        queue.flush()
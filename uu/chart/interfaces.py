@@ -112,6 +112,8 @@ from uu.formlibrary.measure.interfaces import MeasureGroupContentSourceBinder
 from uu.formlibrary.measure.interfaces import PermissiveVocabulary
 
 from uu.chart import _  # MessageFactory for package
+from uu.chart.cache import BoundedCache
+from uu.chart.timing import timed_function
 
 
 # type name globals:
@@ -183,6 +185,14 @@ FREQ_VOCAB = SimpleVocabulary(
     ]]
 )
 
+SPC_VOCAB = SimpleVocabulary(
+    [SimpleTerm(v, title=title) for v, title in [
+        ('none', u'None'),
+        ('run', u'Run chart: median, shifts and trends'),
+        ('xmr', u'Control chart (XmR): mean, control limits'),
+    ]]
+)
+
 WIDTH_UNITS = SimpleVocabulary(
     [SimpleTerm(v, title=title) for v, title in [
         ('%', u'Percentage of content area'),
@@ -209,6 +219,7 @@ VOCAB_PLOT_TYPES = SimpleVocabulary([
     ])
 
 
+@timed_function('resolve_uid')
 def resolve_uid(uid):
     catalog = getSite().portal_catalog
     r = catalog.unrestrictedSearchResults({'UID': str(uid)})
@@ -286,26 +297,53 @@ TIME_DATA_TYPE = 'uu.chart.data.timeseries'     # portal types should
 NAMED_DATA_TYPE = 'uu.chart.data.namedseries'   # match FTIs
 MEASURE_DATA_TYPE = 'uu.chart.data.measureseries'
 
+DATASET_TYPE = 'uu.formlibrary.setspecifier'  # form library data set
+MEASURE_GROUP_TYPE = 'uu.formlibrary.measuregroup'  # contains datasets
 
-## sorting data-point identities need collation/comparator function
-def cmp_point_identities(a, b):
+
+## sorting data-point identities need collation: key function
+IDENTITY_KEY_LIMIT = 100000  # sort keys kept in cache
+_identity_keys = BoundedCache(IDENTITY_KEY_LIMIT)
+
+
+def _identity_key(v):
+    if isinstance(v, basestring):
+        return (2, v.upper())
+    if isinstance(v, date):
+        return (1, datetime(*v.timetuple()[0:6]))  # date|datetime->datetime
+    if isinstance(v, (int, long, float)):
+        return (0, v)
+    return (3, v)
+
+
+def point_identity_key(v):
     """
-    Given point identities a, b (may be string, number, date, etc),
-    collation algorithm compares:
+    Given point identity (may be string, number, date, etc), return a
+    sort key for collation, cached for each identity:
+
+      (a) strings compare case-insensitively;
+
+      (b) dates and datetimes compare by normalizing date->datetime;
 
-      (a) strings case-insensitively
+      (c) all other types compare using defaults from type, with
+          numbers before dates, before strings, before other types.
 
-      (b) dates and datetimes compared by normalizing date->datetime.
+    """
+    try:
+        return _identity_keys[v]
+    except KeyError:
+        key = _identity_keys[v] = _identity_key(v)
+        return key
+    except TypeError:
+        return _identity_key(v)  # unhashable, not cached
 
-      (c) all other types use __cmp__(self, other) defaults from type.
 
+def cmp_point_identities(a, b):
+    """
+    Comparator for point identities a, b; for backward compatibility,
+    prefer sorting with point_identity_key() as key function.
     """
-    dt = lambda d: datetime(*d.timetuple()[0:6])  # date|datetime -> datetime
-    if isinstance(a, basestring) and isinstance(b, basestring):
-        return cmp(a.upper(), b.upper())
-    if isinstance(a, date) or isinstance(b, date):
-        return cmp(dt(a), dt(b))
-    return cmp(a, b)
+    return cmp(point_identity_key(a), point_identity_key(b))
 
 
 class IChartProductLayer(Interface):
@@ -397,6 +435,22 @@ class IDataSeries(form.Schema):
     def display_value(point):
         """Return normalized string display value for point"""
 
+    def point_for(key, default=None):
+        """
+        Return (first) data point with identity (date or name) key, or
+        default if no such point is in the series.
+        """
+
+    def keys():
+        """Return list of unique point identities, in order of data"""
+
+    def points_between(start=None, end=None):
+        """
+        Return list of (time series) points with dates in window of
+        start to end inclusive, in date order; a start or end of None
+        leaves that side of the window unbounded.
+        """
+
     def excluded():
         """
         If applicable, return a list of data points that were
@@ -464,9 +518,12 @@ class IDataCollection(Interface):
 
     def identities():
         """
-        Return a sequence of sorted point identities (names, dates, etc)
-        for all points contained in all series.  These identities are
-        effectively faceted classifiers for points.
+        Return a sequence of unique point identities (names, dates, etc)
+        for all points contained in all series, sorted by identity
+        collation (see point_identity_key()); named series charts
+        instead keep names in order of first appearance in series, as
+        authored.  These identities are effectively faceted classifiers
+        for points.
         """
 
 
@@ -863,6 +920,16 @@ class ITimeSeriesChart(IBaseChart, ITimeSeriesCollection):
         default=False,
         )
 
+    form.order_after(spc='force_crop')
+    spc = schema.Choice(
+        title=u'Statistical process control',
+        description=u'Show center line (and control limits) for each '
+                    u'series, with detection of special-cause signals '
+                    u'(shifts, trends, points outside limits).',
+        vocabulary=SPC_VOCAB,
+        default='none',
+        )
+
     form.omitted('label_overrides')
     label_overrides = schema.Dict(
         key_type=schema.Date(),
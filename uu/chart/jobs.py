@@ -0,0 +1,397 @@
+"""
+uu.chart.jobs -- local, persistent queue for long-running report operations
+(population of report components, static report exports) run outside of
+the web request that asked for them.
+
+  * Jobs are persistent objects stored in a queue kept in the ZODB root
+    mapping; no external message broker is needed, and every ZEO client
+    sees the same queue.
+
+  * Each job names a job function by dotted name.  A job function is
+    called with the (traversed) context of the job, its keyword
+    arguments, and start (units of work already committed), and returns
+    an iterable yielding (done, total) progress tuples after each unit
+    of work from start on.
+
+  * One daemon worker thread per Zope process (started on process start)
+    opens its own ZODB connection, claims queued jobs in FIFO order, and
+    commits a transaction every CHUNK_SIZE units of work, so progress is
+    visible to status views and no transaction grows without bound.  On
+    a database conflict committing a chunk, the chunk is aborted, and
+    the job function called again from the last committed unit, up to
+    CONFLICT_RETRIES times.
+
+  * Jobs run as the user queueing them (anonymous if none), or as the
+    system user if queued with run_as_system.
+
+  * Running jobs record a heartbeat on claim and on each commit of
+    progress; a running job with no heartbeat for STALE_TIMEOUT seconds
+    (its process died or was restarted mid-job) is re-queued by the next
+    worker to look for jobs, or failed after MAX_ATTEMPTS runs.
+"""
+
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+import uuid
+
+from AccessControl.SecurityManagement import getSecurityManager
+from AccessControl.SecurityManagement import newSecurityManager
+from AccessControl.SecurityManagement import noSecurityManager
+from AccessControl.SpecialUsers import nobody
+from AccessControl.SpecialUsers import system as system_user
+from Acquisition import aq_chain
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+from Products.CMFCore.interfaces import ISiteRoot
+from Testing.makerequest import makerequest
+from ZODB.POSException import ConflictError
+from zope.component.hooks import setSite
+from zope.dottedname.resolve import resolve
+from zope.globalrequest import setRequest
+import transaction
+
+
+logger = logging.getLogger('uu.chart.jobs')
+
+QUEUE_KEY = 'uu.chart.jobs'
+
+CHUNK_SIZE = 10         # units of work per transaction commit
+POLL_INTERVAL = 15      # seconds between idle checks for queued jobs
+KEEP_FINISHED = 200     # finished/failed jobs kept for status reporting
+STALE_TIMEOUT = 1800    # seconds without heartbeat before job is abandoned
+MAX_ATTEMPTS = 2        # runs of a job before an abandoned job fails
+CONFLICT_RETRIES = 3    # retries of a chunk after conflicts, per job
+
+QUEUED, RUNNING, FINISHED, FAILED = 'queued', 'running', 'finished', 'failed'
+
+_worker = None  # JobWorker for this process, if started
+
+
+def _isodate(stamp):
+    if stamp is None:
+        return None
+    return datetime.fromtimestamp(stamp).isoformat()
+
+
+class Job(Persistent):
+    """A queued unit of background work and its progress"""
+
+    heartbeat = None    # time of last progress commit, while running
+    attempts = 0        # number of times claimed by a worker
+
+    def __init__(self, func, path, kwargs=None, title=None, userid=None,
+                 run_as_system=False):
+        stamp = time.time()
+        # ids sort in order of creation (FIFO), with a random suffix:
+        self.id = '%017.6f-%s' % (stamp, uuid.uuid4().hex[:8])
+        self.func = func                # dotted name of job function
+        self.path = tuple(path)         # physical path of context
+        self.kwargs = dict(kwargs or {})
+        self.title = title or func.split('.')[-1]
+        self.userid = userid
+        self.run_as_system = run_as_system
+        self.status = QUEUED
+        self.done = 0
+        self.total = None
+        self.message = u''
+        self.created = stamp
+        self.started = self.finished = None
+
+    def progress(self):
+        """Return completed fraction in range 0..1, or None if unknown"""
+        if self.status == FINISHED:
+            return 1.0
+        if not self.total:
+            return None
+        return min(1.0, float(self.done) / self.total)
+
+    def info(self):
+        """Return JSON-friendly dict of job status"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'path': '/'.join(self.path),
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'progress': self.progress(),
+            'message': self.message,
+            'created': _isodate(self.created),
+            'started': _isodate(self.started),
+            'finished': _isodate(self.finished),
+            'attempts': self.attempts,
+            }
+
+    def stale(self, now):
+        """Is job running, without heartbeat for STALE_TIMEOUT seconds?"""
+        if self.status != RUNNING:
+            return False
+        last = self.heartbeat or self.started or self.created
+        return now - last > STALE_TIMEOUT
+
+
+class JobQueue(Persistent):
+    """FIFO queue of Job objects, keyed by (creation-ordered) job id"""
+
+    def __init__(self):
+        self._jobs = OOBTree()
+
+    def add(self, job):
+        self._jobs[job.id] = job
+        self.prune()
+        return job
+
+    def get(self, id, default=None):
+        return self._jobs.get(id, default)
+
+    def jobs(self, path=None):
+        """Return all jobs, optionally only those at or below path"""
+        result = list(self._jobs.values())
+        if path is not None:
+            path = tuple(path)
+            result = [j for j in result if j.path[:len(path)] == path]
+        return result
+
+    def next_queued(self):
+        for job in self._jobs.values():
+            if job.status == QUEUED:
+                return job
+        return None
+
+    def recover(self, now=None):
+        """
+        Re-queue (or fail, after MAX_ATTEMPTS) stale running jobs, whose
+        worker process died or restarted; return list of recovered jobs.
+        """
+        now = now if now is not None else time.time()
+        stale = [j for j in self._jobs.values() if j.stale(now)]
+        for job in stale:
+            job.heartbeat = None
+            if job.attempts < MAX_ATTEMPTS:
+                job.status = QUEUED
+                job.message = u'Interrupted; re-queued.'
+            else:
+                job.status = FAILED
+                job.finished = now
+                job.message = u'Interrupted; failed after %s attempts.' % (
+                    job.attempts,
+                    )
+        return stale
+
+    def prune(self):
+        """Remove oldest completed jobs over KEEP_FINISHED"""
+        done = [k for k, j in self._jobs.items()
+                if j.status in (FINISHED, FAILED)]
+        for key in done[:max(0, len(done) - KEEP_FINISHED)]:
+            del self._jobs[key]
+
+
+def get_queue(context, create=True):
+    """
+    Get job queue in the ZODB root for a persistent context; creates queue
+    if missing, unless create is False (then returns None if missing).
+    """
+    root = context._p_jar.root()
+    if QUEUE_KEY not in root:
+        if not create:
+            return None
+        root[QUEUE_KEY] = JobQueue()
+    return root[QUEUE_KEY]
+
+
+def enqueue(context, func, title=None, run_as_system=False, **kwargs):
+    """
+    Queue job function (dotted name) to be run on context by background
+    worker, as the current user; keyword arguments are stored with the job
+    and must be picklable.  Returns the Job.
+    """
+    userid = None
+    if not run_as_system:
+        userid = getSecurityManager().getUser().getId()
+    job = Job(
+        func,
+        context.getPhysicalPath(),
+        kwargs,
+        title=title,
+        userid=userid,
+        run_as_system=run_as_system,
+        )
+    get_queue(context).add(job)
+    transaction.get().addAfterCommitHook(
+        lambda success: success and wake()
+        )
+    return job
+
+
+def wake():
+    """Tell worker in this process (if any) to look for queued jobs now"""
+    if _worker is not None:
+        _worker.wake()
+
+
+class JobWorker(threading.Thread):
+    """Background thread running queued jobs with its own connection"""
+
+    def __init__(self, db):
+        super(JobWorker, self).__init__(name='uu.chart.jobs worker')
+        self.daemon = True
+        self.db = db
+        self._wake = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            try:
+                self.process()
+            except Exception:
+                logger.exception('Unhandled error processing job queue')
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def process(self):
+        conn = self.db.open()
+        try:
+            self.recover(conn)
+            while True:
+                job_id = self.claim(conn)
+                if job_id is None:
+                    break
+                self.execute(conn, job_id)
+        finally:
+            transaction.abort()
+            conn.close()
+
+    def recover(self, conn):
+        """Re-queue or fail stale jobs left running by a dead worker"""
+        transaction.begin()
+        queue = conn.root().get(QUEUE_KEY)
+        recovered = queue.recover() if queue is not None else []
+        if not recovered:
+            transaction.abort()
+            return
+        try:
+            transaction.commit()
+        except ConflictError:
+            transaction.abort()  # likely recovered by another ZEO client
+            return
+        for job in recovered:
+            logger.warning(
+                'Recovered stale job %s (%s): %s' % (
+                    job.id, job.title, job.status
+                    )
+                )
+
+    def claim(self, conn):
+        """Mark next queued job as running, return its id or None"""
+        transaction.begin()
+        queue = conn.root().get(QUEUE_KEY)
+        job = queue.next_queued() if queue is not None else None
+        if job is None:
+            transaction.abort()
+            return None
+        job.status = RUNNING
+        job.started = job.heartbeat = time.time()
+        job.attempts += 1
+        try:
+            transaction.commit()
+        except ConflictError:
+            transaction.abort()  # likely claimed by another ZEO client
+            return None
+        return job.id
+
+    def _user(self, app, site, job):
+        if job.run_as_system:
+            return system_user
+        if job.userid is None:
+            return nobody  # queued by anonymous user
+        for folder in (site, app):
+            if folder is None:
+                continue
+            acl = folder.acl_users
+            user = acl.getUserById(job.userid)
+            if user is not None:
+                return user.__of__(acl)
+        raise ValueError('Unknown user for job: %s' % job.userid)
+
+    def _fail(self, conn, job_id, message):
+        transaction.abort()
+        job = conn.root()[QUEUE_KEY].get(job_id)
+        job.status = FAILED
+        job.finished = time.time()
+        job.message = unicode(message)
+        transaction.commit()
+
+    def _run(self, job, fn, context):
+        """Run job function from last committed unit, to completion"""
+        units = 0
+        progress = fn(context, start=job.done, **job.kwargs)
+        try:
+            for done, total in progress:
+                job.done, job.total = done, total
+                units += 1
+                if units % CHUNK_SIZE == 0:
+                    job.heartbeat = time.time()
+                    transaction.commit()  # chunk of work, with progress
+            job.status = FINISHED
+            job.finished = time.time()
+            transaction.commit()
+        finally:
+            if hasattr(progress, 'close'):
+                progress.close()  # generator: run its cleanup
+
+    def execute(self, conn, job_id):
+        transaction.begin()
+        job = conn.root()[QUEUE_KEY].get(job_id)
+        app = makerequest(conn.root()['Application'])
+        setRequest(app.REQUEST)
+        try:
+            context = app.unrestrictedTraverse(job.path)
+            sites = [o for o in aq_chain(context) if ISiteRoot.providedBy(o)]
+            site = sites[0] if sites else None
+            setSite(site)
+            newSecurityManager(None, self._user(app, site, job))
+            fn = resolve(job.func)
+            retries = 0
+            while True:
+                try:
+                    self._run(job, fn, context)
+                    break
+                except ConflictError:
+                    retries += 1
+                    if retries > CONFLICT_RETRIES:
+                        raise
+                    transaction.abort()  # chunk, resumed from job.done
+                    logger.warning(
+                        'Conflict running job %s; retrying from %s' % (
+                            job_id, job.done,
+                            )
+                        )
+                    context = app.unrestrictedTraverse(job.path)
+            logger.info('Finished job %s (%s)' % (job.id, job.title))
+        except ConflictError:
+            logger.exception('Conflict running job %s' % job_id)
+            self._fail(conn, job_id, u'Database conflicts; please re-run.')
+        except Exception as e:
+            logger.exception('Error running job %s' % job_id)
+            self._fail(conn, job_id, u'Error: %s' % e)
+        finally:
+            noSecurityManager()
+            setSite(None)
+            setRequest(None)
+
+
+def start_worker(event):
+    """Handler for IProcessStarting: start background worker thread"""
+    global _worker
+    if os.environ.get('UU_CHART_JOBS', 'on').lower() in ('off', 'false', '0'):
+        return
+    if _worker is not None:
+        return
+    import Zope2
+    _worker = JobWorker(Zope2.DB)
+    _worker.start()
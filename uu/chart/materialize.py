@@ -0,0 +1,489 @@
+"""
+uu.chart.materialize -- persistent, incrementally maintained tables of
+measure point info dicts, one per (measure, dataset) pair used by
+measure series providers.
+
+  * A table holds rows of point infos keyed by form UID, computed by
+    evaluating the measure for each form in the dataset once.  Tables
+    are built by background jobs, queued when a measure series provider
+    is saved, or when a table is removed because its measure or dataset
+    changed; reading measure data never builds or writes tables (until
+    a table is complete, data is computed as before).  No build is
+    queued while one for the same table is queued or running.
+
+  * When a form is modified, only its rows are recomputed, in tables
+    containing that form (found via a reverse index of form UIDs).
+
+  * When a form is removed, its rows are removed.  When form library
+    content is added, moved or changes workflow state, its membership
+    is checked in each data set having tables that has rows for it, or
+    may contain it by location (once per data set and transaction,
+    before commit), and only rows for that content are added or removed.
+
+  * Modifying a measure or dataset removes its tables, and queues them
+    to be built again.
+
+  * Whether or not tables exist (or are complete) for them, charts using
+    datasets that may contain changed form library content are
+    invalidated (once per transaction, before commit), so render
+    versions change with measure data that is not materialized.
+
+Tables are kept in an annotation on the site.  Measures and datasets
+that do not support evaluation per-form (measure.points(), and
+dataset.forms()) are not materialized, and are computed as before.
+"""
+
+import threading
+
+from Acquisition import aq_base
+from BTrees.OOBTree import OOBTree, OOTreeSet
+from persistent import Persistent
+from plone.uuid.interfaces import IUUID
+from Products.CMFCore.utils import getToolByName
+from zope.annotation.interfaces import IAnnotations
+from zope.component.hooks import getSite
+import transaction
+
+from uu.chart.dependencies import get_graph
+from uu.chart.indexing import defer
+from uu.chart.interfaces import DATASET_TYPE, MEASURE_DATA_TYPE
+from uu.chart.interfaces import MEASURE_DEFINITION_TYPE, resolve_uid
+from uu.chart.jobs import QUEUED, RUNNING, enqueue, get_queue
+
+
+ANNOTATION_KEY = 'uu.chart.materialized'
+
+FORMLIBRARY_PREFIX = 'uu.formlibrary.'
+
+BUILD_JOB = 'uu.chart.materialize.build_job'
+
+_info_order = lambda info: (info.get('start'), info.get('title'))
+
+_local = threading.local()
+
+
+class MeasureTable(Persistent):
+    """Point infos for a measure and dataset, by form UID"""
+
+    complete = True  # False while being built
+
+    def __init__(self, measure_uid, dataset_uid):
+        self.measure_uid = measure_uid
+        self.dataset_uid = dataset_uid
+        self.rows = OOBTree()  # form UID -> tuple of info dicts
+        self.version = 0
+
+    def set(self, form_uid, infos):
+        self.rows[form_uid] = tuple(infos)
+        self.version += 1
+
+    def discard(self, form_uid):
+        if form_uid in self.rows:
+            del self.rows[form_uid]
+            self.version += 1
+
+    def infos(self):
+        """Return list of all point infos, in order of period, title"""
+        cached = getattr(self, '_v_infos', None)
+        if cached is None or cached[0] != self.version:
+            infos = [info for row in self.rows.values() for info in row]
+            cached = self._v_infos = (
+                self.version,
+                sorted(infos, key=_info_order),
+                )
+        return cached[1]
+
+
+class MaterializedPoints(Persistent):
+    """Tables by (measure UID, dataset UID), with index of form UIDs"""
+
+    generation = 0  # incremented when tables are removed
+
+    def __init__(self):
+        self.tables = OOBTree()
+        self.forms = OOBTree()  # form UID -> OOTreeSet of table keys
+
+    def get(self, measure_uid, dataset_uid):
+        """Complete table for measure, dataset UIDs, or None"""
+        table = self.tables.get((measure_uid, dataset_uid))
+        if table is None or not table.complete:
+            return None
+        return table
+
+    def start(self, measure_uid, dataset_uid):
+        """Add (or replace) an empty, incomplete table; return it"""
+        table = MeasureTable(measure_uid, dataset_uid)
+        table.complete = False
+        self.tables[(measure_uid, dataset_uid)] = table
+        return table
+
+    def set_row(self, table, form_uid, infos):
+        key = (table.measure_uid, table.dataset_uid)
+        table.set(form_uid, infos)
+        if form_uid not in self.forms:
+            self.forms[form_uid] = OOTreeSet()
+        self.forms[form_uid].insert(key)
+
+    def update_form(self, form):
+        """
+        Recompute rows for form in tables containing it; return list of
+        (measure UID, dataset UID) keys of updated tables.
+        """
+        form_uid = IUUID(form, None)
+        keys = self.forms.get(form_uid, ())
+        updated = []
+        for key in keys:
+            table = self.tables.get(key)
+            measure = resolve_uid(key[0])
+            if table is None or measure is None:
+                continue
+            table.set(form_uid, measure.points([form]))
+            updated.append(key)
+        return updated
+
+    def discard_form(self, form_uid, keys=None):
+        """
+        Remove rows for form from tables containing it (or only those of
+        keys given); return list of keys of updated tables.
+        """
+        contained = self.forms.get(form_uid)
+        if contained is None:
+            return []
+        updated = [k for k in contained if keys is None or k in keys]
+        for key in updated:
+            contained.remove(key)
+            table = self.tables.get(key)
+            if table is not None:
+                table.discard(form_uid)
+        if not len(contained):
+            del self.forms[form_uid]
+        return updated
+
+    def remove(self, uid):
+        """Remove tables for a measure or dataset UID; return their keys"""
+        removed = [k for k in self.tables.keys() if uid in k]
+        for key in removed:
+            del self.tables[key]
+        self.generation += 1
+        return removed
+
+    def clear(self):
+        self.tables.clear()
+        self.forms.clear()
+        self.generation += 1
+
+
+def get_materialized(site=None, create=True):
+    site = site or getSite()
+    annotations = IAnnotations(site)
+    if ANNOTATION_KEY not in annotations:
+        if not create:
+            return None
+        annotations[ANNOTATION_KEY] = MaterializedPoints()
+    return annotations[ANNOTATION_KEY]
+
+
+def materializable(measure, dataset):
+    return hasattr(measure, 'points') and hasattr(dataset, 'forms')
+
+
+def table_version(measure_uid, dataset_uid):
+    """
+    Version of materialized table for measure and dataset UIDs, changed
+    whenever its rows change; None if no complete table exists.
+    """
+    store = get_materialized(create=False)
+    if store is None:
+        return None
+    table = store.get(measure_uid, dataset_uid)
+    if table is None:
+        return None
+    return (store.generation, table.version)
+
+
+def measure_infos(measure, dataset):
+    """
+    Get point infos for measure and dataset from materialized table;
+    returns None if there is no complete table (never builds one).
+    """
+    if not materializable(measure, dataset):
+        return None
+    store = get_materialized(create=False)
+    if store is None:
+        return None
+    table = store.get(IUUID(measure), IUUID(dataset))
+    if table is None:
+        return None
+    return table.infos()
+
+
+def building(site, measure_uid, dataset_uid):
+    """Is a job to build table for measure, dataset queued or running?"""
+    queue = get_queue(site, create=False)
+    if queue is None:
+        return False
+    for job in queue.jobs():
+        if (job.func == BUILD_JOB and
+                job.status in (QUEUED, RUNNING) and
+                job.kwargs.get('measure_uid') == measure_uid and
+                job.kwargs.get('dataset_uid') == dataset_uid):
+            return True
+    return False
+
+
+def queue_build(measure_uid, dataset_uid, site=None):
+    """
+    Queue background job to build table for measure and dataset UIDs,
+    unless already queued in this transaction, a complete table exists,
+    or a build job for it is queued or running.
+    """
+    if not measure_uid or not dataset_uid:
+        return
+    site = site or getSite()
+    store = get_materialized(site, create=False)
+    if store is not None and store.get(measure_uid, dataset_uid):
+        return
+    if building(site, measure_uid, dataset_uid):
+        return
+    txn = transaction.get()
+    if getattr(_local, 'build_txn', None) is not txn:
+        _local.build_txn = txn
+        _local.builds = set()
+    key = (measure_uid, dataset_uid)
+    if key in _local.builds:
+        return
+    _local.builds.add(key)
+    enqueue(
+        site,
+        BUILD_JOB,
+        title=u'Materialize measure points',
+        run_as_system=True,
+        measure_uid=measure_uid,
+        dataset_uid=dataset_uid,
+        )
+
+
+def build_job(site, measure_uid, dataset_uid, start=0):
+    """
+    Job function: build table for measure and dataset UIDs, one form at
+    a time; the table is used once complete.  An incomplete table (of a
+    previous build) is built upon, not replaced; resumed (start > 0),
+    rows for forms before start are kept as they are.
+    """
+    store = get_materialized(site)
+    if store.get(measure_uid, dataset_uid) is not None:
+        return  # already built
+    measure = resolve_uid(measure_uid)
+    dataset = resolve_uid(dataset_uid)
+    if not materializable(measure, dataset):
+        return
+    table = store.tables.get((measure_uid, dataset_uid))
+    if table is None:
+        table = store.start(measure_uid, dataset_uid)
+        start = 0
+    forms = list(dataset.forms())
+    for idx, form in enumerate(forms):
+        if idx < start:
+            continue
+        store.set_row(table, IUUID(form), measure.points([form]))
+        yield idx + 1, len(forms)
+    table.complete = True
+    graph = get_graph(site, create=False)
+    if graph is not None:
+        graph.invalidate(measure_uid, dataset_uid)
+
+
+def queue_site_builds(site):
+    """Queue builds of tables for all measure series providers in site"""
+    catalog = getToolByName(site, 'portal_catalog')
+    brains = catalog.unrestrictedSearchResults(
+        {'portal_type': MEASURE_DATA_TYPE}
+        )
+    for brain in brains:
+        provider = brain._unrestrictedGetObject()
+        queue_build(
+            getattr(provider, 'measure', None),
+            getattr(provider, 'dataset', None),
+            site,
+            )
+
+
+def upgrade_queue_builds(context):
+    """Upgrade step: queue table builds for existing providers"""
+    queue_site_builds(getToolByName(context, 'portal_url').getPortalObject())
+
+
+def _path(content):
+    return '/'.join(content.getPhysicalPath())
+
+
+def may_contain(dataset, paths):
+    """
+    Whether dataset may include content at any of the given paths: a
+    dataset restricted to locations (paths, absolute or relative to the
+    site) only includes content within them; any other dataset (or any
+    location not given as a path) may include any content.
+    """
+    locations = getattr(aq_base(dataset), 'locations', None) or ()
+    locations = [str(loc) for loc in locations if loc]
+    if not locations or not all('/' in loc for loc in locations):
+        return True
+    site_path = _path(getSite())
+    for location in locations:
+        location = '/' + location.strip('/')
+        for prefix in (location, site_path + location):
+            for path in paths:
+                if path == prefix or path.startswith(prefix + '/'):
+                    return True
+    return False
+
+
+def _invalidate_datasets(changed):
+    """
+    Invalidate charts using datasets that may contain content changed in
+    transaction (by UID, to set of its paths before and after change).
+    """
+    graph = get_graph(create=False)
+    if graph is None or not len(graph.dependents):
+        return
+    paths = set()
+    for content_paths in changed.values():
+        paths.update(content_paths)
+    catalog = getToolByName(getSite(), 'portal_catalog')
+    brains = catalog.unrestrictedSearchResults({
+        'portal_type': DATASET_TYPE,
+        'UID': list(graph.dependents.keys()),
+        })
+    for brain in brains:
+        if may_contain(brain._unrestrictedGetObject(), paths):
+            graph.invalidate(brain.UID)
+
+
+def _content_changed(context, event=None):
+    """
+    Queue invalidation of charts for form library content changed (by
+    its current path, and former path if moved or removed).
+    """
+    uid = IUUID(context, None)
+    if uid is None:
+        return
+    paths = set()
+    if getattr(event, 'newParent', True) is not None:
+        paths.add(_path(context))
+    if getattr(event, 'oldParent', None) is not None:
+        paths.add('%s/%s' % (_path(event.oldParent), event.oldName))
+    txn = transaction.get()
+    if getattr(_local, 'changed_txn', None) is not txn:
+        _local.changed_txn = txn
+        _local.changed = {}
+        defer(
+            ANNOTATION_KEY + '.datasets',
+            _invalidate_datasets,
+            _local.changed,
+            )
+    _local.changed.setdefault(uid, set()).update(paths)
+
+
+def _invalidate(keys):
+    graph = get_graph(create=False)
+    if graph is None:
+        return
+    for measure_uid, dataset_uid in keys:
+        graph.invalidate(measure_uid, dataset_uid)
+
+
+def _update_membership(forms):
+    """
+    For content (by UID) added, moved or transitioned in transaction,
+    add or remove its rows in tables, by its membership in each dataset
+    having tables that has rows for it, or may contain it (by path; see
+    may_contain()); dataset membership is computed at most once per
+    dataset.
+    """
+    store = get_materialized(create=False)
+    if store is None or not store.tables:
+        return
+    by_dataset = {}
+    for key, table in store.tables.items():
+        by_dataset.setdefault(key[1], []).append(table)
+    datasets = {}  # dataset UID -> dataset, resolved once
+    members = {}   # dataset UID -> UIDs of forms in it, computed once
+    updated = []
+    for form_uid, form in forms.items():
+        paths = [_path(form)]
+        held = set(key[1] for key in store.forms.get(form_uid, ()))
+        for dataset_uid, tables in by_dataset.items():
+            if dataset_uid not in datasets:
+                datasets[dataset_uid] = resolve_uid(dataset_uid)
+            dataset = datasets[dataset_uid]
+            if dataset is None or not hasattr(dataset, 'forms'):
+                continue
+            if dataset_uid not in held and not may_contain(dataset, paths):
+                continue  # no rows for form, and cannot contain it
+            if dataset_uid not in members:
+                members[dataset_uid] = set(
+                    IUUID(f, None) for f in dataset.forms()
+                    )
+            if form_uid not in members[dataset_uid]:
+                keys = [(t.measure_uid, t.dataset_uid) for t in tables]
+                updated.extend(store.discard_form(form_uid, keys))
+                continue
+            for table in tables:
+                measure = resolve_uid(table.measure_uid)
+                if measure is None:
+                    continue
+                store.set_row(table, form_uid, measure.points([form]))
+                updated.append((table.measure_uid, table.dataset_uid))
+    _invalidate(set(updated))
+
+
+def handle_provider_saved(context, event):
+    """Measure series provider added or modified: queue table build"""
+    queue_build(
+        getattr(context, 'measure', None),
+        getattr(context, 'dataset', None),
+        )
+
+
+def handle_content_modified(context, event):
+    """Update materialized tables for modified form, measure or dataset"""
+    portal_type = getattr(context, 'portal_type', '')
+    if not portal_type.startswith(FORMLIBRARY_PREFIX):
+        return
+    is_source = portal_type in (MEASURE_DEFINITION_TYPE, DATASET_TYPE)
+    if not is_source:
+        _content_changed(context)
+    store = get_materialized(create=False)
+    if store is None:
+        return
+    if is_source:
+        for measure_uid, dataset_uid in store.remove(IUUID(context, None)):
+            queue_build(measure_uid, dataset_uid)
+        return  # dependent charts invalidated by dependencies handler
+    _invalidate(store.update_form(context))
+
+
+def handle_membership_changed(context, event):
+    """
+    Form library content added, moved, removed or transitioned: update
+    rows for it in tables (removal now, otherwise before commit).
+    """
+    portal_type = getattr(context, 'portal_type', '')
+    if not portal_type.startswith(FORMLIBRARY_PREFIX):
+        return
+    if portal_type in (MEASURE_DEFINITION_TYPE, DATASET_TYPE):
+        return
+    _content_changed(context, event)
+    store = get_materialized(create=False)
+    uid = IUUID(context, None)
+    if store is None or not store.tables or uid is None:
+        return
+    if getattr(event, 'newParent', True) is None:
+        _invalidate(store.discard_form(uid))  # removed
+        return
+    txn = transaction.get()
+    if getattr(_local, 'membership_txn', None) is not txn:
+        _local.membership_txn = txn
+        _local.forms = {}
+        defer(ANNOTATION_KEY, _update_membership, _local.forms)
+    _local.forms[uid] = context
@@ -1,19 +1,31 @@
+from collections import Counter
 import math
 
 from Acquisition import aq_parent, aq_inner
 from plone.indexer.decorator import indexer
 from plone.uuid.interfaces import IUUID
+from zope.annotation.interfaces import IAnnotations
+from zope.globalrequest import getRequest
 from zope.interface import implements
 
-from uu.chart.content import BaseDataSequence, filter_data, computed_attribute
-from uu.chart.data import NamedDataPoint, TimeSeriesDataPoint
+from uu.chart.cache import BoundedCache
+from uu.chart.content import BaseDataSequence, PointIndex, filter_data
+from uu.chart.data import NamedDataPoint, TimeSeriesDataPoint, intern_key
 from uu.chart.interfaces import IMeasureSeriesProvider
 from uu.chart.interfaces import INamedSeriesChart
 from uu.chart.interfaces import provider_measure, resolve_uid
 from uu.chart.interfaces import AGGREGATE_FUNCTIONS, AGGREGATE_LABELS
+from uu.chart.interfaces import DATASET_TYPE
+from uu.chart.materialize import measure_infos, table_version
+from uu.chart.timing import timed
 
 
-DATASET_TYPE = 'uu.formlibrary.setspecifier'
+REQUEST_CACHE_KEY = 'uu.chart.measureseries'
+
+# PointIndex of computed data by shared key, for all providers (in any
+# report) of the same measure, dataset, summarization and crop:
+SHARED_LIMIT = 2000  # shared keys kept in cache
+_shared = BoundedCache(SHARED_LIMIT)
 
 
 class MeasureSeriesProvider(BaseDataSequence):
@@ -50,7 +62,8 @@ class MeasureSeriesProvider(BaseDataSequence):
             return dict(reversed(items)).values()
         if strategy == 'IGNORE':
             # return only points without duplicated keys
-            return [v for k, v in items if keys.count(k) == 1]
+            counts = Counter(keys)
+            return [v for k, v in items if counts[k] == 1]
         if strategy in AGGREGATE_FUNCTIONS:
             sorted_uniq_keys = []
             fn = AGGREGATE_FUNCTIONS.get(strategy)
@@ -65,15 +78,16 @@ class MeasureSeriesProvider(BaseDataSequence):
                 keymap[k].append(v.value)  # sequence of 1..* values per key
                 pointmap[k] = v  # last point seen for key
             label = dict(AGGREGATE_LABELS).get(strategy)
+            pointcls = self.pointcls
             result = []
             for k in sorted_uniq_keys:
                 vcount = len(keymap[k])
                 if vcount == 0:
                     # special case, only NaN values must have been found,
                     # so we will append a constructed NaN point:
-                    point = self.pointcls(
-                        date=k,
-                        value=float('NaN'),
+                    point = pointcls.trusted(
+                        k,
+                        float('NaN'),
                         note='All respective forms have N/A values for point',
                         )
                     result.append(point)
@@ -81,7 +95,7 @@ class MeasureSeriesProvider(BaseDataSequence):
                     result.append(pointmap[k])  # original point preserved
                 elif vcount > 1:
                     note = u'%s of %s values found.' % (label, vcount)
-                    result.append(self.pointcls(k, fn(keymap[k]), note=note))
+                    result.append(pointcls.trusted(k, fn(keymap[k]), note))
             return result
         return points  # fallback
 
@@ -91,22 +105,31 @@ class MeasureSeriesProvider(BaseDataSequence):
             return filter_data(self, points)
         return points
 
-    def _data(self, filtered=True, excluded=False):
+    def _data(self, filtered=True, excluded=False, infos=None):
+        """
+        Compute points, from info dicts of measure for dataset (computed
+        if not given, e.g. by MeasureExecutor).
+        """
         measure = provider_measure(self)
         if measure is None:
             return []
-        dataset_uid = getattr(self, 'dataset', None)
-        dataset = resolve_uid(dataset_uid)
-        if getattr(dataset, 'portal_type', None) != DATASET_TYPE:
-            return []  # no dataset or wrong type
-        infos = measure.dataset_points(dataset)  # list of info dicts
+        if infos is None:
+            dataset_uid = getattr(self, 'dataset', None)
+            dataset = resolve_uid(dataset_uid)
+            if getattr(dataset, 'portal_type', None) != DATASET_TYPE:
+                return []  # no dataset or wrong type
+            infos = measure_infos(measure, dataset)  # materialized
+            if infos is None:
+                with timed('dataset_points'):
+                    infos = measure.dataset_points(dataset)  # info dicts
         if not infos:
             return []
+        pointcls = self.pointcls
         _key = lambda info: info.get('start')  # datetime.date
-        if self.pointcls == NamedDataPoint:
+        if pointcls == NamedDataPoint:
             _key = lambda info: info.get('title')
-        _point = lambda info: self.pointcls(
-            _key(info),
+        _point = lambda info: pointcls.trusted(
+            intern_key(_key(info)),
             info.get('value'),
             note=measure.value_note(info),
             uri=info.get('url', None),
@@ -115,13 +138,148 @@ class MeasureSeriesProvider(BaseDataSequence):
         if filtered and not excluded:
             all_points = self.filter_data(all_points)
         if excluded:
-            included = self.filter_data(all_points)
+            included = set(self.filter_data(all_points))
             all_points = [p for p in all_points if p not in included]
         return self.summarize(all_points)
 
-    @computed_attribute(level=1)
-    def data(self):
-        return self._data(filtered=True)
+    def _cachekey(self):
+        return (
+            IUUID(self),
+            getattr(self, 'measure', None),
+            getattr(self, 'dataset', None),
+            getattr(self, 'summarization_strategy', None),
+            getattr(self, '_p_mtime', None),
+            )
+
+    def _sharedkey(self):
+        """
+        Content-addressed key for data shared by all providers of the
+        same measure, dataset, summarization, point type and crop window,
+        versioned by the materialized table of point infos (so changes
+        to forms invalidate it); None if there is no table yet.
+        """
+        measure_uid = getattr(self, 'measure', None)
+        dataset_uid = getattr(self, 'dataset', None)
+        version = table_version(measure_uid, dataset_uid)
+        if version is None:
+            return None
+        parent = aq_parent(aq_inner(self))
+        named = INamedSeriesChart.providedBy(parent)
+        crop = None
+        if not named and getattr(parent, 'force_crop', False):
+            crop = (parent.start, parent.end)
+        return (
+            measure_uid,
+            dataset_uid,
+            getattr(self, 'summarization_strategy', None),
+            named,
+            crop,
+            version,
+            )
+
+    def _shared_index(self, infos=None):
+        """PointIndex of data, shared with providers of same shared key"""
+        key = self._sharedkey()
+        if key is not None and key in _shared:
+            return _shared[key]
+        index = PointIndex(self._data(filtered=True, infos=infos))
+        if key is not None:
+            _shared[key] = index
+        return index
+
+    def _cached(self):
+        """
+        Measure data is computed from form data outside this object, so
+        is cached for the duration of the current request, and shared
+        (between requests) with providers having the same shared key.
+        """
+        request = getRequest()
+        if request is None:
+            return self._shared_index()
+        cache = IAnnotations(request).setdefault(REQUEST_CACHE_KEY, {})
+        cachekey = self._cachekey()
+        if cachekey not in cache:
+            cache[cachekey] = self._shared_index()
+        return cache[cachekey]
+
+
+class MeasureExecutor(object):
+    """
+    Computes data for all measure series providers in a chart, grouped
+    by dataset: the forms of each dataset are loaded once, and each
+    distinct measure evaluated over them once; results fill the
+    request-scoped data cache of each provider.
+    """
+
+    def __init__(self, chart):
+        self.chart = chart
+
+    def providers(self):
+        return [
+            seq for seq in self.chart.series()
+            if IMeasureSeriesProvider.providedBy(seq)
+            ]
+
+    def _forms(self, dataset):
+        if not hasattr(dataset, 'forms'):
+            return None
+        with timed('dataset_forms'):
+            return list(dataset.forms())
+
+    def _points(self, measure, dataset, load_forms):
+        """
+        Get infos from materialized table if it exists, otherwise from
+        forms (loaded by calling load_forms) or by dataset.
+        """
+        infos = measure_infos(measure, dataset)
+        if infos is not None:
+            return infos
+        forms = load_forms()
+        if forms is None or not hasattr(measure, 'points'):
+            return measure.dataset_points(dataset)
+        return measure.points(forms)
+
+    def run(self):
+        request = getRequest()
+        if request is None:
+            return  # no request-scoped cache, providers compute as needed
+        cache = IAnnotations(request).setdefault(REQUEST_CACHE_KEY, {})
+        groups = {}  # dataset UID -> providers not yet cached
+        for provider in self.providers():
+            if provider._cachekey() in cache:
+                continue
+            shared = _shared.get(provider._sharedkey())
+            if shared is not None:
+                cache[provider._cachekey()] = shared  # computed before
+                continue
+            dataset_uid = getattr(provider, 'dataset', None)
+            groups.setdefault(dataset_uid, []).append(provider)
+        for dataset_uid, providers in groups.items():
+            dataset = resolve_uid(dataset_uid)
+            if getattr(dataset, 'portal_type', None) != DATASET_TYPE:
+                continue  # providers have no data
+            loaded = []  # forms of dataset, loaded at most once
+
+            def load_forms():
+                if not loaded:
+                    loaded.append(self._forms(dataset))
+                return loaded[0]
+            computed = {}  # measure UID -> infos
+            for provider in providers:
+                measure_uid = getattr(provider, 'measure', None)
+                measure = provider_measure(provider)
+                if measure is None:
+                    continue
+                if measure_uid not in computed:
+                    with timed('dataset_points'):
+                        computed[measure_uid] = self._points(
+                            measure,
+                            dataset,
+                            load_forms,
+                            )
+                cache[provider._cachekey()] = provider._shared_index(
+                    infos=computed[measure_uid],
+                    )
 
 
 @indexer(IMeasureSeriesProvider)
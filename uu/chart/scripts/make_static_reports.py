@@ -23,22 +23,39 @@ directory structure:
 
 """
 
+import copy
 from datetime import date
+from hashlib import sha1
+import json
+import logging
+import multiprocessing
 import os
 import shutil
+import struct
 import sys
 import tempfile
+import time
+import warnings
 import zipfile
 
+import transaction
+from AccessControl.SecurityManagement import noSecurityManager
+from Acquisition import aq_chain
+from Products.CMFCore.interfaces import ISiteRoot
+from Testing.makerequest import makerequest
 from zope.component.hooks import setSite
+from zope.globalrequest import setRequest
 from plone.uuid.interfaces import IUUID
 from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
 
 import uu.chart
-from uu.chart.interfaces import REPORT_TYPE, IBaseChart
-from uu.chart.browser.serialize import ReportJSON, ChartJSON
+from uu.chart.dependencies import render_version
+from uu.chart.interfaces import MEASURE_DATA_TYPE, REPORT_TYPE
+from uu.chart.browser.snapshot import ReportSnapshot
 from uu.chart.browser.chart import ChartView as BaseChartView
 from uu.chart.browser.report import ReportView as BaseReportView
+from uu.chart.jobs import enqueue
+from uu.chart.materialize import table_version
 from uu.formlibrary.utils import local_query
 from uu.formlibrary.tests import test_request
 
@@ -47,10 +64,23 @@ try:
 except ImportError:
     from uu.qiext.utils import get_projects
 
+logger = logging.getLogger('uu.chart.scripts.make_static_reports')
+
 PKG_PATH = uu.chart.__path__[0]
 
 SITENAME = 'qiteamspace'
 
+# incremental mode: fixed archive name, manifest of output content hashes
+# and of the version of each report rendered:
+ARCHIVE_NAME = 'teamspace-reports.zip'
+MANIFEST_NAME = 'teamspace-reports.manifest.json'
+
+# precompressed static resources, cached between runs:
+RESOURCE_CACHE = os.environ.get(
+    'UU_CHART_RESOURCE_CACHE',
+    os.path.join(tempfile.gettempdir(), 'uu.chart-resources'),
+    )
+
 README = """
 UPIQ Data visualization examples, September 2014.
 
@@ -120,37 +150,300 @@ def ignore_project(project):
     return False
 
 
-def populate_resources(basepath):
-    source_dir = os.path.join(PKG_PATH, 'browser', 'resources')
-    dest_dir = os.path.join(basepath, 'resources')
-    shutil.copytree(source_dir, dest_dir)  # incl js, css, jqplot dirs
-    readme = open(os.path.join(basepath, 'README.txt'), 'w+')
-    readme.write(README)
-    readme.close()
+class BaseOutput(object):
+    """
+    Output backend for documents, written by relative path as they are
+    rendered.  A SHA-1 content hash of each document is recorded; when
+    given hashes from a previous run (incremental mode), documents with
+    unchanged content are not rewritten.
+    """
+
+    def __init__(self, previous=None):
+        self.previous = previous    # relpath -> hash, or None: write all
+        self.hashes = {}
+        self.changed = []
+
+    def unchanged(self, relpath, digest):
+        self.hashes[relpath] = digest
+        if self.previous is None:
+            return False
+        return self.previous.get(relpath) == digest
+
+    def write(self, relpath, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        if self.unchanged(relpath, sha1(data).hexdigest()):
+            return False
+        self._write(relpath, data)
+        self.changed.append(relpath)
+        return True
+
+    def _write(self, relpath, data):
+        raise NotImplementedError('abstract')
+
+    def resources(self):
+        """Output static resources (js, css, jqplot) and README"""
+        for relpath, path in resource_files():
+            self.write(relpath, open(path, 'rb').read())
+        self.write('README.txt', README)
+
+    def keep(self, prefix):
+        """
+        Keep documents output by previous run under relative path prefix,
+        without rewriting them; return number of documents kept.
+        """
+        if self.previous is None:
+            return 0
+        prefix = prefix.rstrip('/') + '/'
+        kept = [k for k in self.previous if k.startswith(prefix)]
+        for relpath in kept:
+            self.hashes[relpath] = self.previous[relpath]
+        return len(kept)
+
+    def removed(self):
+        """Relative paths output by previous run, not in this run"""
+        if self.previous is None:
+            return []
+        return [k for k in self.previous if k not in self.hashes]
+
+    def close(self, complete=True):
+        """
+        Finish output; complete is False if the run did not finish, so
+        output of the previous run should be kept (where possible).
+        """
+        pass
+
+
+class DirectoryOutput(BaseOutput):
+    """Output documents as files in a directory tree"""
+
+    def __init__(self, basepath, previous=None):
+        super(DirectoryOutput, self).__init__(previous)
+        self.basepath = basepath
+
+    def unchanged(self, relpath, digest):
+        path = os.path.join(self.basepath, relpath)
+        same = super(DirectoryOutput, self).unchanged(relpath, digest)
+        return same and os.path.exists(path)
+
+    def keep(self, prefix):
+        if not os.path.isdir(os.path.join(self.basepath, prefix)):
+            return 0
+        return super(DirectoryOutput, self).keep(prefix)
+
+    def _write(self, relpath, data):
+        path = os.path.join(self.basepath, relpath)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        f = open(path, 'wb')
+        f.write(data)
+        f.close()
+
+    def close(self, complete=True):
+        if not complete:
+            return
+        for relpath in self.removed():
+            path = os.path.join(self.basepath, relpath)
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+class ArchiveOutput(BaseOutput):
+    """
+    Output documents directly into a zip archive, compressing each as it
+    is written.  In incremental mode, a copy of an existing archive is
+    appended to; if this replaced or removed any members, the copy is
+    compacted on close, copying the compressed data of retained members
+    as-is.  Output is written to a temporary file, renamed to filename
+    only on close of a complete run, so an interrupted run never leaves
+    a damaged archive.
+    """
+
+    def __init__(self, filename, previous=None):
+        self.filename = filename
+        self.tempname = filename + '.partial'
+        self.replaced = set()
+        if previous is not None and os.path.exists(filename):
+            shutil.copyfile(filename, self.tempname)
+            self.archive = zipfile.ZipFile(
+                self.tempname,
+                'a',
+                zipfile.ZIP_DEFLATED,
+                )
+            self.existing = set(self.archive.namelist())
+        else:
+            previous = {} if previous is not None else None
+            self.archive = zipfile.ZipFile(
+                self.tempname,
+                'w',
+                zipfile.ZIP_DEFLATED,
+                )
+            self.existing = set()
+        super(ArchiveOutput, self).__init__(previous)
+
+    def _zinfo(self, relpath):
+        zinfo = zipfile.ZipInfo(relpath, time.localtime()[:6])
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.external_attr = 0644 << 16
+        return zinfo
+
+    def _added(self, relpath):
+        if relpath in self.existing:
+            self.replaced.add(relpath)
+
+    def _write(self, relpath, data):
+        self._added(relpath)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # replaced: duplicate name
+            self.archive.writestr(self._zinfo(relpath), data)
+
+    def resources(self):
+        """
+        Copy precompressed resources from cached archive, without
+        recompressing them.
+        """
+        source = zipfile.ZipFile(resources_archive(), 'r')
+        for zinfo in source.infolist():
+            digest = 'crc32:%08x:%s' % (zinfo.CRC, zinfo.file_size)
+            if self.unchanged(zinfo.filename, digest):
+                continue
+            self._added(zinfo.filename)
+            _raw_copy(source, self.archive, zinfo)
+            self.changed.append(zinfo.filename)
+        source.close()
+
+    def close(self, complete=True):
+        self.archive.close()
+        if not complete:
+            os.unlink(self.tempname)
+            return
+        stale = self.replaced.union(self.removed())
+        if stale:
+            compact_zip(self.tempname, exclude=self.removed())
+        os.rename(self.tempname, self.filename)
+
+
+def manifest_path(output):
+    return os.path.join(output, MANIFEST_NAME)
+
+
+def load_manifest(output):
+    """
+    Load content hashes and report versions from previous incremental run,
+    as a dict with 'files' and 'reports' keys (empty if no previous run).
+    """
+    path = manifest_path(output)
+    manifest = {}
+    if os.path.exists(path):
+        manifest = json.load(open(path))
+    return {
+        'files': manifest.get('files', {}),
+        'reports': manifest.get('reports', {}),
+        }
+
+
+def discard_manifest(output):
+    """
+    Remove manifest of previous run, once loaded: until this run saves
+    its own, output may not match it (e.g. if the run is interrupted).
+    """
+    path = manifest_path(output)
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def save_manifest(output, files, reports):
+    f = open(manifest_path(output), 'w')
+    json.dump(
+        {'files': files.hashes, 'reports': reports},
+        f,
+        indent=1,
+        sort_keys=True,
+        )
+    f.close()
 
 
-def init_base(path, nozip):
+def report_version(brain, catalog):
+    """
+    Version of report output: the latest modification time of the report
+    and its elements (e.g. pages), its render version (which changes
+    when any of its charts, or their data, change), and versions of the
+    materialized tables used by its measure series; None if the render
+    version is not tracked, so report must be rendered.
+    """
+    version = render_version(brain._unrestrictedGetObject())
+    if version is None:
+        return None
+    path = brain.getPath()
+    elements = catalog.unrestrictedSearchResults({
+        'path': {'query': path, 'depth': 1},
+        })
+    modified = max([brain.modified] + [b.modified for b in elements])
+    providers = catalog.unrestrictedSearchResults({
+        'path': {'query': path},
+        'portal_type': MEASURE_DATA_TYPE,
+        })
+    tables = []
+    for provider_brain in providers:
+        provider = provider_brain._unrestrictedGetObject()
+        tables.append(table_version(
+            getattr(provider, 'measure', None),
+            getattr(provider, 'dataset', None),
+            ))
+    return '%s:%s:%s' % (
+        modified.ISO8601(),
+        version,
+        sha1(repr(sorted(tables))).hexdigest(),
+        )
+
+
+def resource_files():
+    """Return (relpath, path) tuples for static resource files"""
+    source_dir = os.path.join(PKG_PATH, 'browser', 'resources')
+    rootlen = len(source_dir) + 1
+    result = []
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            result.append((os.path.join('resources', path[rootlen:]), path))
+    return sorted(result)
+
+
+def resources_archive():
+    """
+    Get path to a cached archive of precompressed static resources and
+    README, (re)built only when resource files change.
+    """
+    key = sha1(README)
+    for relpath, path in resource_files():
+        stat = os.stat(path)
+        key.update('%s:%s:%s' % (relpath, stat.st_size, stat.st_mtime))
+    if not os.path.isdir(RESOURCE_CACHE):
+        os.makedirs(RESOURCE_CACHE)
+    filename = os.path.join(RESOURCE_CACHE, '%s.zip' % key.hexdigest())
+    if not os.path.exists(filename):
+        archive = zipfile.ZipFile(filename + '.tmp', 'w', zipfile.ZIP_DEFLATED)
+        for relpath, path in resource_files():
+            archive.write(path, relpath)
+        archive.writestr('README.txt', README)
+        archive.close()
+        os.rename(filename + '.tmp', filename)
+    return filename
+
+
+def init_output(path, nozip, previous=None):
     if nozip:
         if not os.path.isdir(path):
             if not os.path.exists(path):
                 os.mkdir(path)
             else:
                 raise RuntimeError('Path exists, not a directory')
-        return path
-    basepath = tempfile.mkdtemp()
-    return basepath
-
-
-def make_scaffolding(site, basepath):
-    """directory structure and static assets"""
-    populate_resources(basepath)
-    os.mkdir(os.path.join(basepath, 'content'))
-
-
-def make_project_directory(basepath, name):
-    path = os.path.join(basepath, 'content', name)
-    os.mkdir(path)
-    return path
+        return DirectoryOutput(path, previous)
+    filename = 'teamspace-reports-%s.zip' % (date.today().isoformat(),)
+    if previous is not None:
+        filename = ARCHIVE_NAME
+    return ArchiveOutput(os.path.join(path, filename), previous)
 
 
 def project_reports(project, catalog):
@@ -159,21 +452,6 @@ def project_reports(project, catalog):
     return brains
 
 
-def output_report_json(report, path):
-    uid = IUUID(report)
-    os.mkdir(os.path.join(path, uid))
-    f = open(os.path.join(path, uid, 'report.json'), 'w+')
-    f.write(ReportJSON(report).render())
-    f.close()
-    charts = [o for o in report.objectValues() if IBaseChart.providedBy(o)]
-    for chart in charts:
-        chart_name = '%s.json' % chart.getId()
-        f = open(os.path.join(path, uid, chart_name), 'w+')
-        f.write(ChartJSON(chart).render())
-        f.close()
-    return os.path.join(path, IUUID(report))
-
-
 def output_request(context):
     req = test_request()
     req.form['ajax_load'] = 1
@@ -181,140 +459,324 @@ def output_request(context):
     return req
 
 
-def output_report_html(report, path):
+def render_report(report):
+    """
+    Render JSON and HTML documents for report and its charts, return
+    a list of (filename, data) tuples.
+    """
+    snapshot = ReportSnapshot(report)  # one traversal, shared by all
+    result = [('report.json', snapshot.report_json())]
+    for chart in snapshot.charts:
+        chart_name = '%s.json' % chart.name
+        result.append((chart_name, snapshot.chart_json(chart)))
     req = output_request(report)
-    charts = [o for o in report.objectValues() if IBaseChart.providedBy(o)]
-    for chart in charts:
-        chart_name = os.path.join(path, '%s.html' % chart.getId())
-        view = ChartView(chart, req)
-        f = open(chart_name, 'w+')
-        f.write(view().encode('utf-8'))
-        f.close()
-    report_name = os.path.join(path, 'index.html')
+    for chart in snapshot.charts:
+        chart_name = '%s.html' % chart.name
+        view = ChartView(chart.context, req)
+        result.append((chart_name, view().encode('utf-8')))
     view = ReportView(report, req)
-    f = open(report_name, 'w+')
-    f.write(view().encode('utf-8'))
-    f.close()
+    view.snapshot = snapshot
+    result.append(('index.html', view().encode('utf-8')))
+    return result
 
 
-def make_project_reports(project, brains, path):
-    result = []
-    for brain in brains:
-        report = brain._unrestrictedGetObject()
-        report_path = output_report_json(report, path)
-        result.append((report_path, report.title))
-        output_report_html(report, report_path)
+def render_report_info(report):
+    return IUUID(report), report.title, render_report(report)
+
+
+## process pool rendering: each worker process has its own connection to
+## the database (requires a storage that can be opened by more than one
+## process, e.g. ZEO or RelStorage):
+
+_worker_app = None
+
+
+def _init_worker():
+    global _worker_app
+    from App.config import getConfiguration
+    factory = getConfiguration().dbtab.getDatabaseFactory(name='main')
+    db = factory.open('main', {})  # new DB, not shared with parent process
+    _worker_app = makerequest(db.open().root()['Application'])
+    setRequest(_worker_app.REQUEST)
+
+
+def _render_path(path):
+    report = _worker_app.unrestrictedTraverse(path)
+    setSite(_site_for(report))
+    result = render_report_info(report)
+    transaction.abort()
+    report._p_jar.cacheMinimize()  # keep worker memory use bounded
     return result
 
 
-def make_project_index(project, project_path, reports):
-    project_id = project.getId()
-    project_title = project.title
-    output = open(os.path.join(project_path, 'index.html'), 'w+')
-    output.write(
-        """
-<!DOCTYPE html>
-<html>
-  <head>
-    <title>Project reports index: %s</title>
-  </head>
-  <body>
-    <h1>Reports / index for <em>%s</em> project</h1>
-    <ul>
-        """.strip() % (project_id, project_title.encode('utf-8'))
-        )
-    for path, title in reports:
-        url = './%s' % path[len(project_path) + 1:]  # rel. dir path
-        url = os.path.join(url, 'index.html')  # index page appended
-        html = '<li><a href="%s">%s</a></li>\n' % (url, title)
-        output.write(html)
-    output.write(
-        """
-    </ul>
-  </body>
-</html>
-        """.strip()
-        )
-    output.close()
+def _site_for(context):
+    for o in aq_chain(context):
+        if ISiteRoot.providedBy(o):
+            return o
+    return None
+
+
+def render_pool(jobs=1):
+    """
+    Process pool of jobs workers for rendering, or None if jobs <= 1;
+    one pool is used for a whole run, as each worker opens the database.
+    """
+    if jobs <= 1:
+        return None
+    return multiprocessing.Pool(jobs, initializer=_init_worker)
+
+
+def rendered_reports(brains, pool=None):
+    """
+    Given catalog brains for reports, yield (uid, title, documents)
+    for each report, in order, using process pool if given.
+    """
+    if pool is not None:
+        paths = [brain.getPath() for brain in brains]
+        for result in pool.imap(_render_path, paths):
+            yield result
+        return
+    for brain in brains:
+        yield render_report_info(brain._unrestrictedGetObject())
 
 
-def make_master_index(basepath, paths):
-    output = open(os.path.join(basepath, 'index.html'), 'w+')
-    output.write(
+def index_html(title, heading, links):
+    parts = [
         """
 <!DOCTYPE html>
 <html>
   <head>
-    <title>Reports index</title>
+    <title>%s</title>
   </head>
   <body>
-    <h1>Reports / main index</h1>
+    <h1>%s</h1>
     <ul>
-        """.strip()
-        )
-    for path, title in paths:
-        url = './%s' % path[len(basepath) + 1:]  # rel. dir path
-        url = os.path.join(url, 'index.html')  # index page appended
-        html = '<li><a href="%s">%s</a></li>\n' % (url, title)
-        output.write(html)
-    output.write(
+        """.strip() % (title, heading)
+        ]
+    for url, label in links:
+        parts.append('<li><a href="%s">%s</a></li>\n' % (url, label))
+    parts.append(
         """
     </ul>
   </body>
 </html>
         """.strip()
         )
-    output.close()
+    return ''.join(parts)
 
 
-def copy2zip(basepath, filename):
-    rootlen = len(basepath) + 1
-    archive = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED)
-    for dirpath, dirnames, filenames in os.walk(basepath):
-        for name in filenames:
-            path = os.path.join(dirpath, name)
-            archive.write(path, path[rootlen:])
-    archive.close()
+def make_project_index(project, files, relpath, reports):
+    project_id = project.getId()
+    project_title = project.title
+    links = [('./%s/index.html' % uid, title) for uid, title in reports]
+    files.write(
+        os.path.join(relpath, 'index.html'),
+        index_html(
+            'Project reports index: %s' % project_id,
+            'Reports / index for <em>%s</em> project' % project_title,
+            links,
+            )
+        )
 
 
-def make_zip(basepath, output_dir):
-    filename = 'teamspace-reports-%s.zip' % (date.today().isoformat(),)
-    output_path = os.path.join(output_dir, filename)
-    copy2zip(basepath, output_path)
-    
+def make_master_index(files, paths):
+    links = [('./%s/index.html' % path, title) for path, title in paths]
+    files.write(
+        'index.html',
+        index_html('Reports index', 'Reports / main index', links),
+        )
+
 
-def make_reports(site, nozip, output):
+def _raw_copy(source, target, zinfo):
+    """Copy compressed member of source archive to target, as-is"""
+    source.fp.seek(zinfo.header_offset)
+    fheader = struct.unpack(
+        zipfile.structFileHeader,
+        source.fp.read(zipfile.sizeFileHeader),
+        )
+    source.fp.seek(
+        fheader[zipfile._FH_FILENAME_LENGTH] +
+        fheader[zipfile._FH_EXTRA_FIELD_LENGTH],
+        1,
+        )
+    data = source.fp.read(zinfo.compress_size)
+    zinfo = copy.copy(zinfo)
+    zinfo.flag_bits &= ~0x08  # sizes, CRC are in header (no descriptor)
+    zinfo.header_offset = target.fp.tell()
+    target.fp.write(zinfo.FileHeader())
+    target.fp.write(data)
+    target.filelist.append(zinfo)
+    target.NameToInfo[zinfo.filename] = zinfo
+    target._didModify = True
+
+
+def compact_zip(filename, exclude=()):
+    """
+    Rewrite archive keeping only the last-written member for each name,
+    omitting any excluded names; compressed data is copied as-is.
+    """
+    source = zipfile.ZipFile(filename, 'r')
+    latest = dict((zinfo.filename, zinfo) for zinfo in source.infolist())
+    target = zipfile.ZipFile(filename + '.tmp', 'w', zipfile.ZIP_DEFLATED)
+    for zinfo in source.infolist():
+        if zinfo.filename in exclude or latest[zinfo.filename] is not zinfo:
+            continue
+        _raw_copy(source, target, zinfo)
+    source.close()
+    target.close()
+    os.rename(filename + '.tmp', filename)
+
+
+def iter_reports(site, nozip, output, incremental=False, jobs=1):
+    """
+    Make static reports for all considered projects in site, yielding
+    (done, total) progress tuples after each report is output.
+
+    Documents are written to output (zip archive or directory) as they
+    are rendered.  In incremental mode, a manifest of content hashes for
+    each output document is kept in the output directory, and only
+    documents that changed since the previous run are rewritten; zip
+    output is kept in an archive of a fixed name, updated in place;
+    reports whose version (see report_version()) is unchanged since the
+    previous run are not rendered again.
+    """
     paths = []
-    basepath = init_base(output, nozip)
+    manifest = None
+    if incremental:
+        manifest = load_manifest(output)
+        discard_manifest(output)
+    files = init_output(output, nozip, manifest and manifest['files'])
+    report_versions = {}
     catalog = site.portal_catalog
-    make_scaffolding(site, basepath)
-    all_projects = get_projects(site)
-    considered_projects = [p for p in all_projects if not ignore_project(p)]
-    for project in considered_projects:
-        brains = project_reports(project, catalog)
-        if not brains:
-            print ' -- Skipping project with no reports: %s' % project.getId()
-            continue
-        print '%s: %s reports' % (project.getId(), len(brains))
-        path = make_project_directory(basepath, project.getId())
-        paths.append((path, project.title))
-        reports = make_project_reports(project, brains, path)
-        make_project_index(project, path, reports)
-    make_master_index(basepath, paths)
-    if nozip:
-        return
-    make_zip(basepath, output)
+    complete = False
+    pool = None
+    try:
+        files.resources()
+        all_projects = get_projects(site)
+        considered_projects = [
+            p for p in all_projects if not ignore_project(p)
+            ]
+        project_brains = [(p, project_reports(p, catalog))
+                          for p in considered_projects]
+        total = sum(len(brains) for p, brains in project_brains)
+        done = skipped = 0
+        pool = render_pool(jobs)
+        for project, brains in project_brains:
+            if not brains:
+                logger.info(
+                    'Skipping project with no reports: %s' % project.getId()
+                    )
+                continue
+            logger.info('%s: %s reports' % (project.getId(), len(brains)))
+            relpath = os.path.join('content', project.getId())
+            paths.append((relpath, project.title))
+            reports = []
+            stale = []
+            for brain in brains:
+                uid = brain.UID
+                version = None
+                if incremental:
+                    version = report_version(brain, catalog)
+                report_versions[uid] = version
+                if (version is not None and
+                        manifest['reports'].get(uid) == version and
+                        files.keep(os.path.join(relpath, uid))):
+                    reports.append((uid, brain.Title))  # not re-rendered
+                    skipped += 1
+                    done += 1
+                    yield done, total
+                    continue
+                reports.append((uid, None))  # title set when rendered
+                stale.append(brain)
+            titles = {}
+            for uid, title, documents in rendered_reports(stale, pool):
+                for name, data in documents:
+                    files.write(os.path.join(relpath, uid, name), data)
+                titles[uid] = title
+                done += 1
+                yield done, total
+            reports = [(uid, title or titles[uid]) for uid, title in reports]
+            make_project_index(project, files, relpath, reports)
+        make_master_index(files, paths)
+        complete = True
+    finally:
+        if pool is not None:
+            pool.terminate()
+        files.close(complete)
+    if incremental:
+        logger.info(
+            'Changed: %s, removed: %s, reports not rendered: %s' % (
+                len(files.changed),
+                len(files.removed()),
+                skipped,
+                )
+            )
+        save_manifest(
+            output,
+            files,
+            dict((k, v) for k, v in report_versions.items() if v is not None),
+            )
+    yield done, total
+
+
+def make_reports(site, nozip, output, incremental=False, jobs=1):
+    for progress in iter_reports(site, nozip, output, incremental, jobs):
+        pass
+
+
+def export_job(site, output, nozip=False, incremental=False, start=0):
+    """
+    Job function for static export run by background job worker; a
+    resumed export (start > 0) runs from the beginning, as its output is
+    not kept in the database.
+    """
+    return iter_reports(site, nozip, output, incremental)
+
+
+def _flag(args, name):
+    """Pop flag option from args, return True if found"""
+    return bool(args.pop(args.index(name))) if name in args else False
+
+
+def _option(args, name, default):
+    """Pop option and its value from args, return value or default"""
+    if name not in args:
+        return default
+    idx = args.index(name)
+    args.pop(idx)
+    return type(default)(args.pop(idx))
 
 
 def main(app, args):
-    nozip = args.pop(args.index('--nozip')) if '--nozip' in args else False
+    nozip = _flag(args, '--nozip')
+    background = _flag(args, '--background')
+    incremental = _flag(args, '--incremental')
+    jobs = _option(args, '--jobs', 1)
     if not args:
         print 'Path argument required for output destination, not given.'
         exit(0)
     output_path = args[-1]
     site = app[SITENAME]
     setSite(site)
-    make_reports(site, bool(nozip), output_path)
+    noSecurityManager()  # export as anonymous: only published content
+    if background:
+        # queue export for background worker in a running Zope instance,
+        # run as anonymous user (queued by anonymous), as in foreground:
+        job = enqueue(
+            site,
+            'uu.chart.scripts.make_static_reports.export_job',
+            title=u'Static report export to %s' % output_path,
+            output=output_path,
+            nozip=nozip,
+            incremental=incremental,
+            )
+        transaction.get().note('Queued static report export')
+        transaction.commit()
+        print 'Queued export job %s' % job.id
+        return
+    logger.addHandler(logging.StreamHandler(sys.stdout))
+    logger.setLevel(logging.INFO)
+    make_reports(site, nozip, output_path, incremental, jobs)
 
 
 if __name__ == '__main__' and 'app' in locals():
@@ -0,0 +1,125 @@
+"""
+uu.chart.spc -- statistical process control analysis of time series:
+
+  * Run chart ('run'): center line is the median; signals are shifts
+    (SHIFT_LENGTH or more consecutive points on one side of the median,
+    points on the median neither break nor extend a shift) and trends
+    (TREND_LENGTH or more consecutive points all increasing or all
+    decreasing, repeated values neither break nor extend a trend).
+
+  * Control chart ('xmr', individuals and moving range): center line is
+    the mean; upper/lower control limits are the mean +/- 2.66 times the
+    mean moving range; signals are points outside the limits, and shifts
+    relative to the mean.
+
+Signals are computed in one pass over points (ordered by date); points
+with missing (NaN) values are ignored.
+"""
+
+import math
+
+
+SHIFT_LENGTH = 6
+TREND_LENGTH = 5
+XMR_SCALE = 2.66  # 3 / d2, d2 = 1.128 for moving range of two points
+
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    if not n:
+        return None
+    middle = n // 2
+    if n % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+class SignalScanner(object):
+    """Single-pass detection of shifts and trends about a center line"""
+
+    def __init__(self, center):
+        self.center = center
+        self.shifts = []   # (start key, end key) pairs
+        self.trends = []   # (start key, end key) pairs
+        self.runs = 0      # runs of points on one side of center
+        self._side = self._side_start = self._side_end = None
+        self._side_count = 0
+        self._direction = self._trend_start = self._trend_end = None
+        self._trend_count = 0
+        self._previous = None
+
+    def _end_shift(self):
+        if self._side_count >= SHIFT_LENGTH:
+            self.shifts.append((self._side_start, self._side_end))
+
+    def _end_trend(self):
+        if self._trend_count >= TREND_LENGTH:
+            self.trends.append((self._trend_start, self._trend_end))
+
+    def add(self, key, value):
+        side = cmp(value, self.center)
+        if side:
+            if side != self._side:
+                self._end_shift()
+                self.runs += 1
+                self._side, self._side_start, self._side_count = side, key, 0
+            self._side_count += 1
+            self._side_end = key
+        if self._previous is not None:
+            previous_key, previous_value = self._previous
+            direction = cmp(value, previous_value)
+            if direction:
+                if direction != self._direction:
+                    self._end_trend()
+                    self._direction = direction
+                    self._trend_start, self._trend_count = previous_key, 1
+                self._trend_count += 1
+                self._trend_end = key
+        self._previous = (key, value)
+
+    def finish(self):
+        self._end_shift()
+        self._end_trend()
+
+
+def analyze(points, method='run'):
+    """
+    Return dict of SPC analysis of points (ordered by date) by method:
+    center line, limits (control chart only), counts and signals (as
+    lists of keys, or of [start key, end key] pairs); None if no values.
+    """
+    pairs = sorted(
+        (p.identity(), p.value) for p in points
+        if p.value is not None and not math.isnan(p.value)
+        )
+    if not pairs:
+        return None
+    values = [v for k, v in pairs]
+    result = {'method': method}
+    if method == 'xmr':
+        center = float(sum(values)) / len(values)
+        ranges = [abs(b - a) for a, b in zip(values, values[1:])]
+        spread = 0.0
+        if ranges:
+            spread = XMR_SCALE * float(sum(ranges)) / len(ranges)
+        result['ucl'] = center + spread
+        result['lcl'] = center - spread
+    else:
+        center = median(values)
+    result['center'] = center
+    scanner = SignalScanner(center)
+    outside = []
+    for key, value in pairs:
+        scanner.add(key, value)
+        if method == 'xmr' and spread and not (
+                result['lcl'] <= value <= result['ucl']):
+            outside.append(key)
+    scanner.finish()
+    result['runs'] = scanner.runs
+    result['shifts'] = scanner.shifts
+    if method == 'xmr':
+        result['outside'] = outside
+    else:
+        result['trends'] = scanner.trends
+    return result
@@ -0,0 +1,103 @@
+"""
+uu.chart.stats -- summary statistics and linear trend (least-squares
+fit) for data series, each computed in a single pass over point values.
+
+Points with missing (NaN) values are ignored.  Trend x-values are day
+ordinals for date keys, or 1-based positions of named keys in a list
+of chart categories (as plotted).
+"""
+
+import math
+
+
+def summary(values):
+    """
+    Return dict of count, mean, stdev (sample), min, max for values, or
+    None if there are no (non-NaN) values.
+    """
+    count = 0
+    mean = m2 = 0.0
+    low = high = None
+    for v in values:
+        if v is None or math.isnan(v):
+            continue
+        count += 1
+        delta = v - mean
+        mean += delta / count
+        m2 += delta * (v - mean)  # Welford's algorithm, numerically stable
+        if low is None or v < low:
+            low = v
+        if high is None or v > high:
+            high = v
+    if not count:
+        return None
+    return {
+        'count': count,
+        'mean': mean,
+        'stdev': math.sqrt(m2 / (count - 1)) if count > 1 else 0.0,
+        'min': low,
+        'max': high,
+        }
+
+
+def linear_fit(pairs):
+    """
+    Least-squares fit of (x, y) pairs; return (slope, intercept), or None
+    if fewer than two distinct x values.
+    """
+    n = 0
+    sx = sy = sxx = sxy = 0.0
+    origin = None  # x values shifted to first, for precision of sums
+    for x, y in pairs:
+        if y is None or math.isnan(y):
+            continue
+        if origin is None:
+            origin = x
+        x -= origin
+        n += 1
+        sx += x
+        sy += y
+        sxx += x * x
+        sxy += x * y
+    denominator = n * sxx - sx * sx
+    if n < 2 or not denominator:
+        return None
+    slope = (n * sxy - sx * sy) / denominator
+    return slope, (sy - slope * sx) / n - slope * origin
+
+
+def x_value(key, positions=None):
+    """x-value for a point key: day ordinal, or position (1..N) of name"""
+    if positions is not None:
+        return positions[key] + 1
+    return key.toordinal()
+
+
+def trend(points, categories=None):
+    """
+    Linear trend of points, as dict of slope (per day, or per category),
+    intercept, and fitted start and end (key, value) pairs; None if there
+    are insufficient points to fit.
+    """
+    positions = None
+    if categories is not None:
+        positions = dict((k, i) for i, k in enumerate(categories))
+        points = [p for p in points if p.identity() in positions]
+    pairs = [(x_value(p.identity(), positions), p.value) for p in points]
+    fit = linear_fit(pairs)
+    if fit is None:
+        return None
+    slope, intercept = fit
+    fitted = [
+        (p.identity(), slope * x + intercept)
+        for p, (x, y) in zip(points, pairs)
+        if y is not None and not math.isnan(y)
+        ]
+    first = min(fitted, key=lambda pair: x_value(pair[0], positions))
+    last = max(fitted, key=lambda pair: x_value(pair[0], positions))
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'start': first,
+        'end': last,
+        }
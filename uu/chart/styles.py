@@ -2,7 +2,11 @@ from plone.dexterity.content import Container, Item
 from plone.uuid.interfaces import IUUID
 from zope.interface import implements
 
+from Products.CMFCore.utils import getToolByName
+
 from interfaces import IChartStyleBook, ILineStyle, IBaseChart
+from dependencies import get_graph
+from indexing import defer
 from browser.styles import clone_chart_styles
 
 
@@ -22,25 +26,42 @@ class LineStyle(Item):
     implements(ILineStyle)
 
 
-def handle_stylebook_modified(context, event):
+def propagate_stylebook(stylebook):
     """
-    When stylebook is modified, find any charts in same report
-    that are bound to it, and update them.
+    Copy styles of stylebook to any charts bound to it (found via the
+    dependency graph), changing only differing attributes.
     """
-    bookuid = IUUID(context)
-    report = context.__parent__
-    charts = [o for o in report.objectValues() if IBaseChart.providedBy(o)]
-    if not charts:
+    bookuid = IUUID(stylebook)
+    graph = get_graph(create=False)
+    if graph is None:
+        # graph not yet built (pre-upgrade site): charts in same report
+        report = stylebook.__parent__
+        for target in report.objectValues():
+            if not IBaseChart.providedBy(target):
+                continue
+            if getattr(target, 'stylebook', None) == bookuid:
+                clone_chart_styles(stylebook, target)
         return
-    bound = [o for o in charts if getattr(o, 'stylebook', None) == bookuid]
+    bound = graph.dependents_of(bookuid)
     if not bound:
         return
-    for target in bound:
-        clone_chart_styles(context, target)
-        target.reindexObject()
+    catalog = getToolByName(stylebook, 'portal_catalog')
+    for brain in catalog.unrestrictedSearchResults({'UID': bound}):
+        target = brain._unrestrictedGetObject()
+        if getattr(target, 'stylebook', None) != bookuid:
+            continue  # stale edge
+        if clone_chart_styles(stylebook, target):
+            graph.bump(brain.UID)
+
+
+def handle_stylebook_modified(context, event):
+    """
+    When stylebook is modified, propagate its styles to bound charts,
+    once per transaction (merging repeated edits to book, line styles).
+    """
+    defer(('uu.chart.stylebook', IUUID(context)), propagate_stylebook, context)
 
 
 def handle_line_style_modified(context, event):
     stylebook = context.__parent__
     handle_stylebook_modified(stylebook, None)
-
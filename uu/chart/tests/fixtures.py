@@ -0,0 +1,148 @@
+# content fixtures for uu.chart tests and benchmarks
+
+from datetime import date
+import random
+
+from plone.dexterity.utils import createContentInContainer
+
+from uu.chart.interfaces import REPORT_TYPE, TIMESERIES_TYPE, NAMEDSERIES_TYPE
+from uu.chart.interfaces import TIME_DATA_TYPE, NAMED_DATA_TYPE
+from uu.chart.interfaces import MEASURE_DATA_TYPE
+from uu.chart.measureseries import DATASET_TYPE
+
+
+SERIES_KINDS = ('csv', 'named', 'measure')
+
+
+def month_dates(count, start=date(2000, 1, 1)):
+    """Return list of count first-of-month dates, from start"""
+    result = []
+    for i in range(start.month - 1, start.month - 1 + count):
+        result.append(date(start.year + i // 12, i % 12 + 1, 1))
+    return result
+
+
+def csv_input(keys, seed=0):
+    """Make CSV input for a data sequence, one row per key"""
+    rng = random.Random(seed)
+    rows = []
+    for i, key in enumerate(keys):
+        if isinstance(key, date):
+            key = key.strftime('%m/%d/%Y')
+        note = 'note %s' % i if i % 5 == 0 else ''
+        rows.append('%s,%.3f,%s' % (key, rng.uniform(0, 100), note))
+    return u'\n'.join(rows)
+
+
+class MockDataset(object):
+    """Stands in for a form library data set (set specifier)"""
+
+    portal_type = DATASET_TYPE
+
+    def __init__(self, uid):
+        self.uid = uid
+
+
+class MockMeasure(object):
+    """
+    Stands in for a form library measure; dataset_points() returns info
+    dicts for (by default) two forms per period, so providers summarize.
+    """
+
+    def __init__(self, uid, periods, per_period=2, seed=0):
+        self.uid = uid
+        self.periods = periods  # not points: measure API has points()
+        self.per_period = per_period
+        self.seed = seed
+
+    def dataset_points(self, dataset):
+        rng = random.Random(self.seed)
+        result = []
+        for d in month_dates(self.periods):
+            for i in range(self.per_period):
+                result.append({
+                    'start': d,
+                    'title': u'Form %s' % d.isoformat(),
+                    'value': rng.uniform(0, 100),
+                    'url': 'http://nohost/forms/%s-%s' % (d.isoformat(), i),
+                    })
+        return result
+
+    def value_note(self, info):
+        return None
+
+
+class MockMeasureResolver(object):
+    """
+    Callable replacement for uu.chart.interfaces.resolve_uid, resolving
+    mock measure and dataset UIDs, deferring to original otherwise.
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self.objects = {}
+
+    def add(self, obj):
+        self.objects[obj.uid] = obj
+        return obj
+
+    def __call__(self, uid):
+        if uid in self.objects:
+            return self.objects[uid]
+        return self.original(uid)
+
+
+def synthetic_report(container, id, charts, series, points, kind='csv',
+                     resolver=None):
+    """
+    Create report in container with charts x series x points of data, for
+    series of kind 'csv' (time series), 'named' or 'measure'; measure
+    series use mock measures/datasets added to resolver.
+    """
+    report = createContentInContainer(
+        container,
+        REPORT_TYPE,
+        id=id,
+        title=u'Report %s' % id,
+        )
+    chart_type = NAMEDSERIES_TYPE if kind == 'named' else TIMESERIES_TYPE
+    for c in range(charts):
+        chart = createContentInContainer(
+            report,
+            chart_type,
+            id='chart-%s' % c,
+            title=u'Chart %s' % c,
+            )
+        for s in range(series):
+            seed = c * series + s
+            title = u'Series %s' % s
+            if kind == 'named':
+                keys = [u'Category %s' % i for i in range(points)]
+                createContentInContainer(
+                    chart,
+                    NAMED_DATA_TYPE,
+                    title=title,
+                    input=csv_input(keys, seed),
+                    )
+            elif kind == 'measure':
+                measure = resolver.add(
+                    MockMeasure('measure-%s' % seed, points, seed=seed)
+                    )
+                dataset = resolver.add(MockDataset('dataset-%s' % seed))
+                createContentInContainer(
+                    chart,
+                    MEASURE_DATA_TYPE,
+                    title=title,
+                    measure=measure.uid,
+                    dataset=dataset.uid,
+                    summarization_strategy='AVG',
+                    )
+            else:
+                createContentInContainer(
+                    chart,
+                    TIME_DATA_TYPE,
+                    title=title,
+                    input=csv_input(month_dates(points), seed),
+                    )
+    return report
+
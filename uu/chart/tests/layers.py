@@ -1,5 +1,7 @@
 # test layers for uu.chart -- requires plone.app.testing
 
+import os
+
 from plone.app.testing import PloneSandboxLayer
 from plone.app.testing import PLONE_FIXTURE
 from plone.app.testing import IntegrationTesting, FunctionalTesting
@@ -34,14 +36,98 @@ class DefaultProfileTestLayer(ProductLayer):
     PROFILE = 'uu.chart:default'
 
 
+# workflow id matching conventions of workspace workflows (see wfinfo):
+WORKSPACE_WORKFLOW = 'workspace_workflow'
+
 # fixture bases:
 DEFAULT_PROFILE_FIXTURE = DefaultProfileTestLayer()
 
+
+class BenchmarkLayer(PloneSandboxLayer):
+    """
+    Layer with synthetic reports (charts x series x points) for each
+    size in SIZES and each kind of series in SERIES_KINDS, in portal as
+    'bench-{size}-{kind}'; measure series use mock measures and data
+    sets, resolved by layer['resolver'] while the layer is set up.
+    Reports and charts use a workflow named as the workspace workflow
+    (a copy of simple_publication_workflow), as chart JSON expects.
+
+    Reports are only built if UU_CHART_BENCHMARK is set in environment,
+    as benchmarks are otherwise skipped.
+    """
+
+    defaultBases = (DEFAULT_PROFILE_FIXTURE,)
+
+    # (charts, series, points) sizes of synthetic reports:
+    SIZES = {
+        'small': (4, 3, 24),
+        'large': (20, 8, 120),
+        }
+
+    def _modules(self):
+        """modules using resolve_uid, replaced by mock resolver"""
+        from uu.chart import interfaces, materialize, measureseries
+        return (interfaces, materialize, measureseries)
+
+    def _workflow(self, portal):
+        """Use a workspace workflow for reports and charts"""
+        from Products.CMFCore.utils import getToolByName
+        from uu.chart.interfaces import CHART_TYPES, REPORT_TYPE
+        wftool = getToolByName(portal, 'portal_workflow')
+        if WORKSPACE_WORKFLOW not in wftool.objectIds():
+            wftool.manage_clone(
+                wftool['simple_publication_workflow'],
+                WORKSPACE_WORKFLOW,
+                )
+        wftool.setChainForPortalTypes(
+            CHART_TYPES + (REPORT_TYPE,),
+            WORKSPACE_WORKFLOW,
+            )
+
+    def setUpPloneSite(self, portal):
+        from plone.app.testing import TEST_USER_ID, TEST_USER_NAME
+        from plone.app.testing import login, setRoles
+        from uu.chart import interfaces
+        from uu.chart.tests.fixtures import MockMeasureResolver
+        from uu.chart.tests.fixtures import SERIES_KINDS, synthetic_report
+        resolver = MockMeasureResolver(interfaces.resolve_uid)
+        self['resolver'] = resolver
+        for module in self._modules():
+            module.resolve_uid = resolver
+        if not os.environ.get('UU_CHART_BENCHMARK'):
+            return
+        self._workflow(portal)
+        setRoles(portal, TEST_USER_ID, ['Manager'])
+        login(portal, TEST_USER_NAME)
+        for size, (charts, series, points) in sorted(self.SIZES.items()):
+            for kind in SERIES_KINDS:
+                synthetic_report(
+                    portal,
+                    'bench-%s-%s' % (size, kind),
+                    charts,
+                    series,
+                    points,
+                    kind=kind,
+                    resolver=resolver,
+                    )
+
+    def tearDownPloneSite(self, portal):
+        for module in self._modules():
+            module.resolve_uid = self['resolver'].original
+        del self['resolver']
+
+
+BENCHMARK_FIXTURE = BenchmarkLayer()
+
 # layers for use by Integration tests:
 DEFAULT_PROFILE_TESTING = IntegrationTesting(
     bases=(DEFAULT_PROFILE_FIXTURE,),
     name='uu.chart:Default Profile')
 
+BENCHMARK_TESTING = IntegrationTesting(
+    bases=(BENCHMARK_FIXTURE,),
+    name='uu.chart:Benchmark')
+
 # Functional testing layers:
 DEFAULT_PROFILE_FUNCTIONAL_TESTING = FunctionalTesting(
     bases=(DEFAULT_PROFILE_FIXTURE,),
@@ -0,0 +1,242 @@
+"""
+Benchmarks for the uu.chart data pipeline, using synthetic reports of
+charts x series x points for CSV time series, named series and (mock)
+measure series providers, built by the benchmark test layer.
+
+Skipped unless UU_CHART_BENCHMARK is set in environment:
+
+  UU_CHART_BENCHMARK=1        run, compare to baselines in benchmarks.json
+  UU_CHART_BENCHMARK=record   run, (re)write baselines in benchmarks.json
+
+Each stage is timed separately (best of REPEAT runs), with net allocation
+of objects and number of catalog queries; request-scoped caches and the
+shared cache of measure data are cleared before each run, so stages time
+rendering, not cache hits.  A stage fails if its time, allocation or
+query count exceeds its baseline by more than TOLERANCE.  Baselines are
+specific to a machine, so are not kept in the repository: stages with
+no baseline are recorded in benchmarks.json by the first run comparing
+them (which then fails, listing them, so no stage passes unmeasured).
+Allocations are compared only to baselines measured the same way (bytes
+with tracemalloc, else objects).
+"""
+
+import gc
+import json
+import os
+import time
+
+import unittest2 as unittest
+
+from plone.app.testing import TEST_USER_ID, setRoles
+from zope.annotation.interfaces import IAnnotations
+from zope.globalrequest import getRequest
+
+from uu.chart import measureseries
+from uu.chart.browser.serialize import ChartJSON, ReportJSON
+from uu.chart.tests.fixtures import SERIES_KINDS
+from uu.chart.tests.layers import BENCHMARK_TESTING
+
+try:
+    import tracemalloc  # Python 3.4+, or pytracemalloc-patched Python 2
+except ImportError:
+    tracemalloc = None
+
+
+MODE = os.environ.get('UU_CHART_BENCHMARK', '').lower()
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'benchmarks.json')
+
+REPEAT = 5
+
+TOLERANCE = 1.5  # fail if > 150% of baseline time, allocation or queries
+
+ALLOCATOR = 'tracemalloc' if tracemalloc is not None else 'gc'
+
+
+class CatalogQueryCounter(object):
+    """Count catalog searches, while installed on a catalog tool"""
+
+    METHODS = ('searchResults', 'unrestrictedSearchResults')
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.count = 0
+
+    def _counted(self, name):
+        original = getattr(self.catalog, name)
+
+        def counted(*args, **kwargs):
+            self.count += 1
+            return original(*args, **kwargs)
+        return counted
+
+    def install(self):
+        for name in self.METHODS:
+            setattr(self.catalog, name, self._counted(name))
+
+    def uninstall(self):
+        for name in self.METHODS:
+            self.catalog.__dict__.pop(name, None)
+
+
+def uncached(fn):
+    """
+    Wrap fn to clear request-scoped caches (e.g. report snapshot,
+    measure data) and shared measure data before each call.
+    """
+    def call():
+        request = getRequest()
+        if request is not None:
+            annotations = IAnnotations(request)
+            for key in list(annotations.keys()):
+                del annotations[key]
+        measureseries._shared.clear()
+        return fn()
+    return call
+
+
+def measure(fn, repeat=REPEAT):
+    """
+    Call fn repeat times; return dict of best time (seconds), net
+    allocation (bytes with tracemalloc, else count of gc-tracked objects,
+    as named by ALLOCATOR) of a single call.
+    """
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        allocated = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+    else:
+        before = len(gc.get_objects())
+        result = fn()
+        allocated = len(gc.get_objects()) - before
+    del result
+    return {
+        'time': min(times),
+        'allocated': allocated,
+        'allocator': ALLOCATOR,
+        }
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return {}
+    return json.load(open(BASELINES))
+
+
+def save_baselines(baselines):
+    f = open(BASELINES, 'w')
+    json.dump(baselines, f, indent=2, sort_keys=True)
+    f.close()
+
+
+@unittest.skipUnless(MODE, 'Set UU_CHART_BENCHMARK to run benchmarks')
+class PipelineBenchmark(unittest.TestCase):
+    """Benchmark data pipeline stages for synthetic reports"""
+
+    layer = BENCHMARK_TESTING
+
+    results = {}  # shared by all tests, compared/saved in tearDownClass
+
+    def setUp(self):
+        self.portal = self.layer['portal']
+        setRoles(self.portal, TEST_USER_ID, ['Manager'])
+        self.counter = CatalogQueryCounter(self.portal.portal_catalog)
+        self.counter.install()
+
+    def tearDown(self):
+        self.counter.uninstall()
+
+    def _report(self, size, kind):
+        return self.portal['bench-%s-%s' % (size, kind)]
+
+    def _series(self, report):
+        return [seq for chart in report.objectValues()
+                for seq in chart.series()]
+
+    def _record(self, name, fn):
+        fn = uncached(fn)
+        self.counter.count = 0
+        fn()  # warm (volatile/request caches, catalog) and count queries
+        queries = self.counter.count
+        result = measure(fn)
+        result['queries'] = queries
+        self.results[name] = result
+        return result
+
+    def _run_stages(self, size, kind):
+        report = self._report(size, kind)
+        series = self._series(report)
+        charts = report.objectValues()
+        prefix = '%s.%s' % (size, kind)
+        self._record(
+            '%s.data' % prefix,
+            lambda: [seq._data() for seq in series],
+            )
+        if kind == 'measure':
+            points = [seq._data() for seq in series]
+            # summarize unsummarized (duplicated key) points:
+            raw = [p + p for p in points]
+            self._record(
+                '%s.summarize' % prefix,
+                lambda: [seq.summarize(p) for seq, p in zip(series, raw)],
+                )
+        self._record(
+            '%s.chart_json' % prefix,
+            lambda: [ChartJSON(chart)._chart() for chart in charts],
+            )
+        self._record(
+            '%s.report_json' % prefix,
+            lambda: ReportJSON(report).render(),
+            )
+
+    def test_small(self):
+        for kind in SERIES_KINDS:
+            self._run_stages('small', kind)
+
+    def test_large(self):
+        for kind in SERIES_KINDS:
+            self._run_stages('large', kind)
+
+    @classmethod
+    def tearDownClass(cls):
+        baselines = load_baselines()
+        if MODE == 'record':
+            baselines.update(cls.results)
+            save_baselines(baselines)
+            return
+        regressions = []
+        recorded = {}
+        for name, r in sorted(cls.results.items()):
+            base = baselines.get(name)
+            if base is None:
+                recorded[name] = r
+                regressions.append(
+                    '%s: no baseline, recorded (%.2f ms, %s queries); '
+                    'run again to compare' % (
+                        name, r['time'] * 1000, r['queries'])
+                    )
+                continue
+            metrics = ['time', 'queries']
+            if base.get('allocator') == r['allocator']:
+                metrics.append('allocated')
+            for metric in metrics:
+                if r[metric] > max(base[metric], 0) * TOLERANCE:
+                    regressions.append(
+                        '%s %s: %s (baseline %s)' % (
+                            name, metric, r[metric], base[metric])
+                        )
+        if recorded:
+            baselines.update(recorded)
+            save_baselines(baselines)
+        if regressions:
+            raise AssertionError(
+                'Benchmark regressions:\n  ' + '\n  '.join(regressions)
+                )
@@ -0,0 +1,115 @@
+import unittest2 as unittest
+
+from uu.chart.browser import serialize
+from uu.chart.browser.serialize import chart_delta, series_delta
+from uu.chart.browser.serialize import parse_loaded, recall, remember
+
+
+def series(uid, *data):
+    return {'uid': uid, 'title': uid, 'data': list(data)}
+
+
+class SeriesDeltaTest(unittest.TestCase):
+    """Test series_delta()"""
+
+    def test_unchanged(self):
+        s = series('a', ('2014-01-01', {'value': 1}))
+        self.assertIsNone(series_delta(s, dict(s)))
+
+    def test_new(self):
+        s = series('a', ('2014-01-01', {'value': 1}))
+        self.assertIs(series_delta(None, s), s)
+
+    def test_changed_added_removed(self):
+        old = series(
+            'a',
+            ('2014-01-01', {'value': 1}),
+            ('2014-02-01', {'value': 2}),
+            ('2014-03-01', {'value': 3}),
+            )
+        new = series(
+            'a',
+            ('2014-01-01', {'value': 1}),
+            ('2014-02-01', {'value': 5}),
+            ('2014-04-01', {'value': 4}),
+            )
+        result = series_delta(old, new)
+        self.assertTrue(result['partial'])
+        self.assertEqual(
+            result['data'],
+            [('2014-02-01', {'value': 5}), ('2014-04-01', {'value': 4})],
+            )
+        self.assertEqual(result['removed'], ['2014-03-01'])
+        self.assertEqual(len(new['data']), 3)  # new is not modified
+
+
+class ChartDeltaTest(unittest.TestCase):
+    """Test chart_delta()"""
+
+    def test_unknown(self):
+        new = {'uid': 'c', 'series': [series('a')]}
+        self.assertIs(chart_delta(None, new), new)
+        # series without UID are not comparable:
+        old = {'uid': 'c', 'series': [{'data': []}]}
+        new = {'uid': 'c', 'series': [{'data': []}]}
+        self.assertIs(chart_delta(old, new), new)
+
+    def test_delta(self):
+        a = series('a', ('x', {'value': 1}))
+        b = series('b', ('x', {'value': 2}))
+        b2 = series('b', ('x', {'value': 3}))
+        c = series('c', ('y', {'value': 4}))
+        old = {'uid': 'chart', 'title': 'Old', 'series': [a, b]}
+        new = {'uid': 'chart', 'title': 'New', 'series': [c, b2, a]}
+        result = chart_delta(old, new)
+        self.assertTrue(result['delta'])
+        self.assertEqual(result['title'], 'New')
+        self.assertEqual(result['series_order'], ['c', 'b', 'a'])
+        # only changed series: c is new (complete), b partial, a omitted
+        self.assertEqual(len(result['series']), 2)
+        self.assertIs(result['series'][0], c)
+        self.assertTrue(result['series'][1]['partial'])
+        self.assertEqual(result['series'][1]['data'], [('x', {'value': 3})])
+
+
+class HistoryTest(unittest.TestCase):
+    """Test remember(), recall() of rendered chart data by version"""
+
+    def setUp(self):
+        serialize._history.clear()
+
+    tearDown = setUp
+
+    def test_exact_version(self):
+        remember('c', 3, {'n': 3})
+        remember('c', 5, {'n': 5})
+        self.assertEqual(recall('c', 3), {'n': 3})
+        self.assertEqual(recall('c', 5), {'n': 5})
+        # data at other versions is unknown, never a neighbouring one:
+        self.assertIsNone(recall('c', 4))
+        self.assertIsNone(recall('c', 6))
+        self.assertIsNone(recall('other', 3))
+
+    def test_depth(self):
+        for version in range(1, serialize.HISTORY_DEPTH + 2):
+            remember('c', version, {'n': version})
+        self.assertIsNone(recall('c', 1))
+        self.assertEqual(recall('c', 2), {'n': 2})
+
+    def test_untracked(self):
+        remember('c', None, {'n': 0})
+        self.assertNotIn('c', serialize._history)
+
+
+class ParseLoadedTest(unittest.TestCase):
+    """Test parse_loaded()"""
+
+    def test_parse(self):
+        self.assertEqual(
+            parse_loaded('a:3,b:,c:x,:4,d'),
+            [('a', 3), ('b', None), ('c', None), ('d', None)],
+            )
+
+    def test_empty(self):
+        self.assertIsNone(parse_loaded(None))
+        self.assertIsNone(parse_loaded(''))
@@ -0,0 +1,55 @@
+from datetime import date, datetime
+
+import unittest2 as unittest
+
+from uu.chart.content import NamedSeriesChart, TimeSeriesChart
+
+
+class MockSeries(object):
+    """Series with only keys (point identities), in order of its data"""
+
+    def __init__(self, *keys):
+        self._keys = keys
+
+    def keys(self):
+        return list(self._keys)
+
+
+class IdentitiesTest(unittest.TestCase):
+    """Test merged identities of series in charts"""
+
+    def test_timeseries_sorted(self):
+        chart = TimeSeriesChart('chart')
+        result = chart._merged_identities([
+            MockSeries(date(2014, 3, 1), date(2014, 1, 1)),
+            MockSeries(date(2014, 2, 1), date(2014, 3, 1)),
+            MockSeries(),
+            ])
+        self.assertEqual(
+            result,
+            [date(2014, 1, 1), date(2014, 2, 1), date(2014, 3, 1)],
+            )
+
+    def test_timeseries_collation(self):
+        chart = TimeSeriesChart('chart')
+        # dates and datetimes collate together, duplicates skipped:
+        result = chart._merged_identities([
+            MockSeries(date(2014, 2, 1), datetime(2014, 1, 1)),
+            MockSeries(datetime(2014, 2, 1), date(2014, 1, 15)),
+            ])
+        self.assertEqual(
+            result,
+            [datetime(2014, 1, 1), date(2014, 1, 15), date(2014, 2, 1)],
+            )
+
+    def test_named_first_appearance(self):
+        # named categories keep authored order, not collation order:
+        chart = NamedSeriesChart('chart')
+        result = chart._merged_identities([
+            MockSeries(u'Zebra', u'apple', u'Mango'),
+            MockSeries(u'banana', u'apple', u'Zebra', u'cherry'),
+            ])
+        self.assertEqual(
+            result,
+            [u'Zebra', u'apple', u'Mango', u'banana', u'cherry'],
+            )
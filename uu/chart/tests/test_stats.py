@@ -0,0 +1,144 @@
+from datetime import date
+
+import unittest2 as unittest
+
+from uu.chart import spc, stats
+
+
+NaN = float('NaN')
+
+
+class Point(object):
+    """Minimal data point: identity key and value"""
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+    def identity(self):
+        return self.key
+
+
+def monthly(values, year=2014):
+    """Points for values, one per month (first of month) from January"""
+    return [
+        Point(date(year + i // 12, i % 12 + 1, 1), v)
+        for i, v in enumerate(values)
+        ]
+
+
+class SummaryTest(unittest.TestCase):
+    """Test stats.summary()"""
+
+    def test_integers(self):
+        result = stats.summary(range(1, 13))
+        self.assertEqual(result['count'], 12)
+        self.assertAlmostEqual(result['mean'], 6.5)
+        self.assertAlmostEqual(result['stdev'], 3.605551, places=6)
+        self.assertEqual(result['min'], 1)
+        self.assertEqual(result['max'], 12)
+
+    def test_missing_values(self):
+        result = stats.summary([2.0, NaN, None, 4.0])
+        self.assertEqual(result['count'], 2)
+        self.assertAlmostEqual(result['mean'], 3.0)
+        self.assertIsNone(stats.summary([]))
+        self.assertIsNone(stats.summary([NaN, None]))
+
+    def test_single_value(self):
+        result = stats.summary([5])
+        self.assertEqual(result['stdev'], 0.0)
+        self.assertEqual(result['mean'], 5.0)
+
+
+class TrendTest(unittest.TestCase):
+    """Test stats.trend()"""
+
+    def test_named(self):
+        categories = ['a', 'b', 'c', 'd']
+        points = [Point(k, v) for k, v in zip(categories, (2, 4, 6, 8))]
+        result = stats.trend(points, categories)
+        self.assertAlmostEqual(result['slope'], 2.0)
+        self.assertAlmostEqual(result['intercept'], 0.0)
+        self.assertEqual(result['start'][0], 'a')
+        self.assertAlmostEqual(result['start'][1], 2.0)
+        self.assertEqual(result['end'][0], 'd')
+        self.assertAlmostEqual(result['end'][1], 8.0)
+
+    def test_dates(self):
+        points = [
+            Point(date(2014, 1, 1), 10),
+            Point(date(2014, 1, 11), 15),
+            Point(date(2014, 1, 21), 20),
+            ]
+        result = stats.trend(points)
+        self.assertAlmostEqual(result['slope'], 0.5)
+        self.assertEqual(result['start'][0], date(2014, 1, 1))
+        self.assertAlmostEqual(result['start'][1], 10.0)
+        self.assertEqual(result['end'][0], date(2014, 1, 21))
+        self.assertAlmostEqual(result['end'][1], 20.0)
+
+    def test_missing_values(self):
+        points = monthly([1.0, NaN, None, 4.0])
+        result = stats.trend(points)
+        self.assertEqual(result['start'][0], points[0].key)
+        self.assertEqual(result['end'][0], points[3].key)
+        self.assertAlmostEqual(result['start'][1], 1.0)
+        self.assertAlmostEqual(result['end'][1], 4.0)
+
+    def test_insufficient(self):
+        self.assertIsNone(stats.trend([]))
+        self.assertIsNone(stats.trend(monthly([3.0])))
+        self.assertIsNone(stats.trend(monthly([3.0, NaN])))
+
+
+class SPCTest(unittest.TestCase):
+    """Test spc.analyze()"""
+
+    def test_xmr_integers(self):
+        result = spc.analyze(monthly(range(1, 13)), 'xmr')
+        self.assertAlmostEqual(result['center'], 6.5)
+        self.assertAlmostEqual(result['ucl'], 6.5 + spc.XMR_SCALE)
+        self.assertAlmostEqual(result['lcl'], 6.5 - spc.XMR_SCALE)
+        keys = [p.key for p in monthly(range(1, 13))]
+        self.assertEqual(result['outside'], keys[:3] + keys[-3:])
+        self.assertEqual(result['runs'], 2)
+        self.assertEqual(result['shifts'], [(keys[0], keys[5]),
+                                            (keys[6], keys[11])])
+
+    def test_xmr_constant(self):
+        result = spc.analyze(monthly([4] * 8), 'xmr')
+        self.assertEqual(result['center'], 4.0)
+        self.assertEqual(result['ucl'], result['lcl'])
+        self.assertEqual(result['outside'], [])
+        self.assertEqual(result['shifts'], [])
+
+    def test_run_median(self):
+        odd = spc.analyze(monthly([3, 1, 2]), 'run')
+        self.assertEqual(odd['center'], 2)
+        even = spc.analyze(monthly([1, 2, 3, 4]), 'run')
+        self.assertAlmostEqual(even['center'], 2.5)
+
+    def test_run_shift(self):
+        values = [1, 9, 9, 9, 5, 9, 9, 9, 1, 1, 1, 1, 1]
+        keys = [p.key for p in monthly(values)]
+        result = spc.analyze(monthly(values), 'run')
+        self.assertEqual(result['center'], 5)
+        # points on the median neither break nor extend a shift:
+        self.assertEqual(result['shifts'], [(keys[1], keys[7])])
+        self.assertEqual(result['runs'], 3)
+
+    def test_run_trend(self):
+        values = [1, 2, 2, 3, 4, 5, 1]
+        keys = [p.key for p in monthly(values)]
+        result = spc.analyze(monthly(values), 'run')
+        # repeated values neither break nor extend a trend:
+        self.assertEqual(result['trends'], [(keys[0], keys[5])])
+        short = spc.analyze(monthly([1, 2, 3, 4, 1]), 'run')
+        self.assertEqual(short['trends'], [])
+
+    def test_missing_values(self):
+        self.assertIsNone(spc.analyze([], 'xmr'))
+        self.assertIsNone(spc.analyze(monthly([NaN, None]), 'run'))
+        result = spc.analyze(monthly([1, NaN, 3]), 'xmr')
+        self.assertAlmostEqual(result['center'], 2.0)
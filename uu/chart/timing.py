@@ -0,0 +1,109 @@
+"""
+uu.chart.timing -- per-request timings and counters for chart data
+pipeline stages (catalog lookups, measure computation, labels, JSON).
+
+Timings are only recorded between start() and stop() in the current
+thread; otherwise timed() and the timed_function() decorator cost one
+thread-local attribute lookup.  JSON views start timings when enabled
+by environment (UU_CHART_TIMING=on), and report them in a Server-Timing
+response header.
+"""
+
+import os
+import threading
+import time
+
+
+ENABLED = os.environ.get('UU_CHART_TIMING', 'off').lower() in (
+    'on', 'true', '1',
+    )
+
+_local = threading.local()
+
+
+class Timings(object):
+    """Accumulated elapsed time and call count, by stage name"""
+
+    def __init__(self):
+        self.created = time.time()
+        self.stages = {}  # name -> [count, seconds]
+
+    def add(self, name, elapsed):
+        stage = self.stages.setdefault(name, [0, 0.0])
+        stage[0] += 1
+        stage[1] += elapsed
+
+    def total(self):
+        return time.time() - self.created
+
+    def info(self):
+        """Return JSON-friendly dict of timings (in milliseconds)"""
+        return {
+            'total': round(self.total() * 1000, 3),
+            'stages': dict(
+                (name, {'count': count, 'ms': round(seconds * 1000, 3)})
+                for name, (count, seconds) in self.stages.items()
+                ),
+            }
+
+    def header(self):
+        """Return value for Server-Timing header"""
+        parts = [
+            '%s;dur=%.3f;desc="%s calls"' % (name, seconds * 1000, count)
+            for name, (count, seconds) in sorted(self.stages.items())
+            ]
+        parts.append('total;dur=%.3f' % (self.total() * 1000))
+        return ', '.join(parts)
+
+
+def start():
+    """Start recording timings for current thread, return Timings"""
+    _local.timings = Timings()
+    return _local.timings
+
+
+def stop():
+    """Stop recording timings for current thread, return Timings or None"""
+    timings = current()
+    _local.timings = None
+    return timings
+
+
+def current():
+    return getattr(_local, 'timings', None)
+
+
+class timed(object):
+    """Context manager timing a named stage, if recording"""
+
+    def __init__(self, name):
+        self.name = name
+        self.timings = None
+
+    def __enter__(self):
+        self.timings = getattr(_local, 'timings', None)
+        if self.timings is not None:
+            self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if self.timings is not None:
+            self.timings.add(self.name, time.time() - self.started)
+
+
+def timed_function(name):
+    """Decorator for function timed as named stage, if recording"""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            timings = getattr(_local, 'timings', None)
+            if timings is None:
+                return func(*args, **kwargs)
+            started = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.add(name, time.time() - started)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator